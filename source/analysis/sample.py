@@ -15,11 +15,13 @@ from icecream import ic
 
 ic.configureOutput(prefix="")
 sys.path.append(str(Path.cwd()))
-from source.data.basic import get_industry_classification
+from source.data.basic import merge_industry
 from source.data.trade import StockReturn
 from source.lead_lag.factor import Factor
 from source.modules.cache import Cache, cp
+from source.modules.dtypes import compact
 from source.modules.setting import Setting
+from source.modules.tools import period_to_ordinal
 
 
 class TestSample(object):
@@ -30,10 +32,8 @@ class TestSample(object):
         self.freq: str = freq
         self.ll_column: str = f"{measure}({cashflow})"
         self.df_ll = (
-            Factor()
-            .df_ll[  # type:ignore
-                ["industry_code", "period", self.ll_column]
-            ]
+            Factor()  # type:ignore
+            .lead_lag(columns=["industry_code", "period", self.ll_column])
             .dropna(subset=self.ll_column)
         )
         self.industry_number = self.df_ll["industry_code"].nunique()
@@ -43,16 +43,13 @@ class TestSample(object):
 
     def shift_ll_period(self):
         shift_period: int = Setting.shift_rank_period if self.is_shift else 0
+        # Shift, compare and join on quarter ordinals instead of periods.
+        self.df_ll["period"] = period_to_ordinal(self.df_ll["period"])
         if self.freq == "Q":
-            self.df_ll["period"] = self.df_ll["period"].map(
-                lambda x: pd.Period(x, freq="Q") + shift_period
-            )
+            self.df_ll["period"] = self.df_ll["period"] + shift_period
         elif self.freq == "Y":
-            self.df_ll["period"] = self.df_ll["period"].map(
-                lambda x: pd.Period(x, freq="Q")
-            )
             self.df_ll[self.ll_column] = self.df_ll.groupby(
-                [self.df_ll["period"].dt.year, self.df_ll["industry_code"]]
+                [self.df_ll["period"] // 4, self.df_ll["industry_code"]]
             )[self.ll_column].transform(lambda x: x.iloc[0])
             self.df_ll["period_new"] = self.df_ll["period"] + shift_period
             # ic(self.df_ll["period"])
@@ -85,20 +82,22 @@ class TestSample(object):
             .applymap(self.group_rule)
         )
         # Date type
-        self.df_ll["year"] = self.df_ll["period"].dt.year
-        self.df_ll["quarter"] = self.df_ll["period"].dt.quarter
-        self.df_ll = self.df_ll.drop(columns="period")
+        self.df_ll["year"] = self.df_ll["period"] // 4
+        self.df_ll["quarter"] = self.df_ll["period"] % 4 + 1
+        self.df_ll = compact(self.df_ll.drop(columns="period"))
 
     def portfolio_sample(self):
         return (
             pd.merge(
                 self.df_ll,
                 # Merge stock return
-                pd.merge(
-                    StockReturn().df_ret,
-                    get_industry_classification(),  # type:ignore
-                    on=["stock", "year", "quarter"],
-                    how="inner",
+                merge_industry(
+                    # Only read returns of years with LL portfolios
+                    StockReturn().get_df_ret(
+                        filters={
+                            "year": (self.df_ll["year"].min(), self.df_ll["year"].max())
+                        }
+                    )
                 ),
                 on=["industry_code", "year", "quarter"],
                 how="inner",
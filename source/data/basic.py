@@ -7,6 +7,7 @@
 MarketType().df_market_type \n
 ListedDelistedDate().df_listed \n
 AnnotationDate().df_anno \n
+df = merge_industry(df) \n
 df_industry = get_industry_classification()
 """
 
@@ -14,14 +15,16 @@ df_industry = get_industry_classification()
 import sys
 from pathlib import Path
 
+import numpy as np
 import pandas as pd
 from icecream import ic
 
 ic.configureOutput(prefix="")
 sys.path.append(str(Path.cwd()))
+from source.data.origin import Origin
 from source.modules.cache import Cache
 from source.modules.setting import Setting
-from source.modules.tools import singleton
+from source.modules.tools import quarter_ordinal, singleton
 
 
 @singleton
@@ -36,132 +39,170 @@ class MarketType(object):
     64=北证A股市场
     """
 
-    def __init__(
-        self,
-        file_name: str = "market_type.csv",
-        columns: list[str] = ["stock", "market_type"],
-    ) -> None:
-        self.df_market_type: pd.DataFrame = pd.read_csv(
-            f"{Setting.basic_path}/{file_name}"
-        )
-        self.df_market_type.columns = columns
-        # Convert data type
-        self.df_market_type = self.df_market_type.astype(
-            {"stock": int, "market_type": int}
-        )
+    def __init__(self) -> None:
+        self.df_market_type: pd.DataFrame = Origin.load("market_type")
 
 
 @singleton
 class ListedDelistedDate(object):
-    def __init__(
-        self,
-        file_name: str = "listed_delisted.csv",
-        columns: list[str] = ["stock", "listed_date", "delisted_date"],
-    ) -> None:
-        self.df_listed = pd.read_csv(f"{Setting.basic_path}/{file_name}")
-        self.df_listed.columns = columns
-        # Convert data type
-        self.df_listed["stock"] = self.df_listed["stock"].astype(int)
-        self.df_listed["listed_date"] = pd.to_datetime(self.df_listed["listed_date"])
-        self.df_listed["delisted_date"] = pd.to_datetime(
-            self.df_listed["delisted_date"]
-        )
-        self.df_listed["listed_year_quarter"] = self.df_listed["listed_date"].map(
-            lambda x: pd.Period(x, freq="Q")
+    """
+    stock, listed_date, delisted_date, listed_quarter \n
+    `listed_quarter` is the quarter ordinal of `listed_date` (see `quarter_ordinal`).
+    """
+
+    def __init__(self) -> None:
+        self.df_listed: pd.DataFrame = Origin.load("listed_delisted")
+        self.df_listed["listed_quarter"] = quarter_ordinal(
+            self.df_listed["listed_date"].dt.year,
+            self.df_listed["listed_date"].dt.quarter,
         )
 
 
 @singleton
 class AnnotationDate(object):
-    def __init__(
-        self,
-        file_name: str = "annotation_date.csv",
-        columns: list[str] = ["stock", "year", "quarter", "annotation_date"],
-    ) -> None:
-        self.df_anno = pd.read_csv(f"{Setting.basic_path}/{file_name}")
-        self.df_anno.columns = columns
-        self.df_anno = self.df_anno.astype({"stock": int, "year": int, "quarter": int})
-        self.df_anno["annotation_date"] = pd.to_datetime(
-            self.df_anno["annotation_date"]
-        )
-        self.df_anno = self.df_anno[self.df_anno["year"] >= Setting.sample_start_year]
+    def __init__(self) -> None:
+        self.df_anno: pd.DataFrame = Origin.load("annotation_date")
 
 
 @singleton
 class IndustryClassification(object):
-    def __init__(
-        self,
-        file_name: str = "industry_classification.csv",
-        columns: list[str] = ["stock", "implement_date", "industry_code"],
-    ) -> None:
+    """
+    Point-in-time industry classification
+    ------
+    Each classification of a stock holds from the quarter of its `implement_date` \n
+    until the quarter of the next one, and the last one until the stock is delisted:
+
+    - df_interval: stock, start, end, industry_code \n
+    `start`/`end` are quarter ordinals (see `quarter_ordinal`), `end` is exclusive.
+    - df_industry: The dense stock × year × quarter expansion, built on demand.
+    """
+
+    def __init__(self) -> None:
         # Get industry classification
-        self.df_industry = pd.read_csv(f"{Setting.basic_path}/{file_name}")
-        self.df_industry.columns = columns
-        self.df_industry["implement_date"] = pd.to_datetime(
-            self.df_industry["implement_date"]
-        )
-        self.df_industry = self.df_industry.astype({"stock": int, "industry_code": int})
-        # Get delisted date
-        self.delisted_dict = self.get_delisted_date()
-        # Generate dummy year-quarter industry classification data
-        self.dummy_year_quarter_generator()
-        # Set start year
-        self.df_industry = self.df_industry[
-            self.df_industry["year"] >= Setting.sample_start_year
-        ]
+        self.df_classification: pd.DataFrame = Origin.load("industry_classification")
+        # Generate classification intervals
+        self.df_interval: pd.DataFrame = self.interval_generator()
 
-    def get_delisted_date(self):
-        return (
+    def get_delisted_quarter(self) -> pd.Series:
+        """Quarter ordinal of the last quarter end before delisting (now if listed)"""
+        delisted_date: pd.Series = (
             ListedDelistedDate()
-            .df_listed.set_index("stock")["delisted_date"]
+            .df_listed.drop_duplicates(subset="stock")
+            .set_index("stock")["delisted_date"]
+            .reindex(self.df_classification["stock"].unique())
             .fillna(pd.Timestamp("now").floor("D"))
-            .to_dict()
         )
+        # The quarter ends until the delisted date (included)
+        delisted_date = delisted_date + pd.Timedelta(days=1)
+        return (
+            quarter_ordinal(delisted_date.dt.year, delisted_date.dt.quarter) - 1
+        ).rename("delisted")
 
-    def dummy_year_quarter_func(self, df: pd.DataFrame) -> pd.DataFrame:
-        """`apply` function to generate dummy year-quarter data"""
-        # Generate dummy date
-        df_dummy = pd.DataFrame(
-            pd.date_range(
-                start=df["implement_date"].min(),
-                end=self.delisted_dict.get(df.name, pd.Timestamp("now").floor("D")),
-                freq="Q",
-            ),
-            columns=["date"],
+    def interval_generator(self) -> pd.DataFrame:
+        """Classification intervals [start, end) of each stock"""
+        df_interval: pd.DataFrame = self.df_classification.sort_values(
+            by=["stock", "implement_date"], kind="stable"
+        )
+        df_interval["start"] = quarter_ordinal(
+            df_interval["implement_date"].dt.year,
+            df_interval["implement_date"].dt.quarter,
+        )
+        # The latest classification in a quarter takes effect
+        df_interval = df_interval.drop_duplicates(
+            subset=["stock", "start"], keep="last"
         )
-        # Generate `year` and `quarter` columns
-        df_dummy["year"] = df_dummy["date"].dt.year
-        df_dummy["quarter"] = df_dummy["date"].dt.quarter
-        # Merge and return data
-        return pd.merge(
-            df, df_dummy.drop(columns="date"), on=["year", "quarter"], how="outer"
+        df_interval = pd.merge(
+            df_interval,
+            self.get_delisted_quarter(),
+            left_on="stock",
+            right_index=True,
+            how="left",
+        )
+        # A classification ends at the next one or at delisting,
+        # and always covers the quarter it is implemented in.
+        next_start: pd.Series = df_interval.groupby("stock")["start"].shift(-1)
+        df_interval["end"] = np.maximum(
+            np.fmin(next_start, df_interval["delisted"] + 1),
+            df_interval["start"] + 1,
+        ).astype(int)
+        return df_interval[["stock", "start", "end", "industry_code"]].reset_index(
+            drop=True
         )
 
-    def dummy_year_quarter_generator(self) -> None:
-        """Year and Quarter Generator"""
-        # Generate `year` and `quarter` columns
-        self.df_industry["year"] = self.df_industry["implement_date"].dt.year
-        self.df_industry["quarter"] = self.df_industry["implement_date"].dt.quarter
-        # Generate dummy year-quarter data
-        self.df_industry = (
-            self.df_industry.groupby("stock")
-            .apply(lambda df: self.dummy_year_quarter_func(df))
-            .drop(columns=["stock", "implement_date"])
-            .reset_index()
-            .drop(columns="level_1")
-            .sort_values(by=["stock", "year", "quarter"])
+    @property
+    def df_industry(self) -> pd.DataFrame:
+        """Dense stock × year × quarter industry classification"""
+        start: np.ndarray = self.df_interval["start"].to_numpy()
+        length: np.ndarray = self.df_interval["end"].to_numpy() - start
+        # Quarter ordinals of every interval, without a loop over stocks
+        offset: np.ndarray = np.arange(length.sum()) - np.repeat(
+            np.cumsum(length) - length, length
+        )
+        ordinal: np.ndarray = np.repeat(start, length) + offset
+        df_industry = pd.DataFrame(
+            {
+                "stock": np.repeat(self.df_interval["stock"].to_numpy(), length),
+                "industry_code": np.repeat(
+                    self.df_interval["industry_code"].to_numpy(), length
+                ),
+                "year": ordinal // 4,
+                "quarter": ordinal % 4 + 1,
+            }
         )
-        # Forward fill nan `industry_code`
-        self.df_industry[["industry_code"]] = self.df_industry.groupby("stock")[
-            ["industry_code"]
-        ].ffill()
+        # Set start year
+        return df_industry[df_industry["year"] >= Setting.sample_start_year]
 
 
-@Cache(file_path=f"{Setting.cache_path}/industry_classification.csv", test=False)
+@Cache(
+    file_path=f"{Setting.cache_path}/industry_interval.parquet",
+    test=False,
+    settings=["basic_path"],
+)
+def get_industry_interval():
+    Origin.prefetch("industry_classification", "listed_delisted")
+    return IndustryClassification().df_interval
+
+
+@Cache(
+    file_path=f"{Setting.cache_path}/industry_classification.parquet",
+    test=False,
+    settings=["basic_path", "sample_start_year"],
+)
 def get_industry_classification():
     return IndustryClassification().df_industry
 
 
+def merge_industry(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Point-in-time industry of each row
+    ------
+    Equivalent to an inner merge of `df` (with `stock`, `year`, `quarter` columns) \n
+    and `get_industry_classification()`, done as one vectorized as-of join on the \n
+    classification intervals.
+    """
+    df_interval: pd.DataFrame = get_industry_interval()  # type: ignore
+    # Composite (stock, quarter ordinal) keys, sorted for the intervals
+    shift: int = 2**16
+    stock: np.ndarray = df["stock"].to_numpy(dtype=np.int64)
+    ordinal: np.ndarray = quarter_ordinal(
+        df["year"].to_numpy(dtype=np.int64), df["quarter"].to_numpy(dtype=np.int64)
+    )
+    interval_stock: np.ndarray = df_interval["stock"].to_numpy(dtype=np.int64)
+    interval_start: np.ndarray = df_interval["start"].to_numpy(dtype=np.int64)
+    interval_key: np.ndarray = interval_stock * shift + interval_start
+    # The latest interval starting before each row
+    position: np.ndarray = (
+        np.searchsorted(interval_key, stock * shift + ordinal, side="right") - 1
+    )
+    matched: np.ndarray = position >= 0
+    position = np.where(matched, position, 0)
+    matched &= interval_stock[position] == stock
+    matched &= ordinal < df_interval["end"].to_numpy()[position]
+    df = df[matched].reset_index(drop=True)
+    df["industry_code"] = df_interval["industry_code"].to_numpy()[position[matched]]
+    return df
+
+
 if __name__ == "__main__":
     ...
     # df_market = MarketType().df_market_type
@@ -172,5 +213,7 @@ if __name__ == "__main__":
     # ic(df_anno)
     # df_industry = IndustryClassification().df_industry
     # ic(df_industry)
+    # df_interval = get_industry_interval()
+    # ic(df_interval)
     # df_industry = get_industry_classification()
     # ic(df_industry)
@@ -18,238 +18,155 @@ from icecream import ic
 ic.configureOutput(prefix="")
 warnings.filterwarnings("ignore")
 sys.path.append(str(Path.cwd()))
+from source.data.origin import Origin
 from source.modules.cache import Cache
 from source.modules.setting import Setting
 from source.modules.tools import singleton
 
 
-def cal_diff(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
-    """Calculate difference for given columns in a DataFrame"""
-    # Construct a copy of stock and year data
-    df_range: pd.DataFrame = df[["stock", "year"]]
-    df_range["start_year"] = df_range["year"]
-    df_range["end_year"] = df_range["year"] + 1
-    # Search for the start year and end year for stocks
-    df_range = (
-        df_range.groupby("stock")[["start_year", "end_year"]]
-        .agg({"start_year": min, "end_year": max})
-        .reset_index()
+def cal_diff(df_list: list[pd.DataFrame]) -> pd.DataFrame:
+    """
+    Convert year-to-date (cumulative) statements into quarterly values
+    ------
+    All statements are de-cumulated in one pass over a dense stock × year × quarter \n
+    array: the value of quarter 1 is kept and every later quarter subtracts the \n
+    previous one (NaN if either is missing). Each stock covers the years from its \n
+    first to its last report of each statement.
+
+    Args:
+    ------
+        df_list (list[pd.DataFrame]): Statements with `stock`, `year`, `quarter` columns.
+
+    Returns:
+    ------
+        pd.DataFrame: stock, year, quarter and the columns of all statements, \n
+        sorted by stock, year and quarter.
+    """
+    keys: list[str] = ["stock", "year", "quarter"]
+    # Stocks and their year range over all statements
+    stocks, stock_index = np.unique(
+        np.concatenate([df["stock"].to_numpy() for df in df_list]), return_inverse=True
+    )
+    years: np.ndarray = np.concatenate([df["year"].to_numpy() for df in df_list])
+    start_year: np.ndarray = np.full(len(stocks), years.max())
+    end_year: np.ndarray = np.full(len(stocks), years.min())
+    np.minimum.at(start_year, stock_index, years)
+    np.maximum.at(end_year, stock_index, years)
+    year_number: np.ndarray = end_year - start_year + 1
+    offset: np.ndarray = np.cumsum(year_number) - year_number
+    # Stock and year of each row (stock-year) of the dense array
+    stock_year: np.ndarray = np.repeat(np.arange(len(stocks)), year_number)
+    year: np.ndarray = (
+        np.arange(year_number.sum())
+        - np.repeat(offset, year_number)
+        + start_year[stock_year]
+    )
+    # Dense (stock-year, quarter, column) array of cumulative values
+    columns: list[str] = []
+    value_list: list[np.ndarray] = []
+    # Stock-years within the year range of at least one statement
+    covered: np.ndarray = np.zeros(len(year), dtype=bool)
+    row_start: int = 0
+    for df in df_list:
+        df_columns: list[str] = [column for column in df.columns if column not in keys]
+        index: np.ndarray = stock_index[row_start : row_start + len(df)]
+        row_start += len(df)
+        df_year: np.ndarray = df["year"].to_numpy()
+        # Scatter the statement into the dense array
+        values: np.ndarray = np.full((len(year), 4, len(df_columns)), np.nan)
+        values[
+            offset[index] + df_year - start_year[index], df["quarter"].to_numpy() - 1
+        ] = df[df_columns].to_numpy(dtype=float)
+        columns += df_columns
+        value_list.append(values)
+        # Year range of the statement (empty for stocks not in it)
+        df_start: np.ndarray = np.full(len(stocks), years.max() + 1)
+        df_end: np.ndarray = np.full(len(stocks), years.min() - 1)
+        np.minimum.at(df_start, index, df_year)
+        np.maximum.at(df_end, index, df_year)
+        covered |= (year >= df_start[stock_year]) & (year <= df_end[stock_year])
+    values = np.concatenate(value_list, axis=2)
+    # Calculate difference of cashflow data (quarter 0 is 0)
+    values[:, 1:, :] = values[:, 1:, :] - values[:, :-1, :]
+    df_diff = pd.DataFrame(
+        {
+            "stock": np.repeat(stocks[stock_year], 4),
+            "year": np.repeat(year, 4),
+            "quarter": np.tile(np.arange(1, 5), len(year)),
+        }
     )
-    # Merge year-quarter time series of all stocks with the origin EBIT/EBITDA data
-    df = pd.merge(
-        df,
-        pd.concat(
-            # Construct year-quarter time series for all stocks
-            df_range[["stock", "start_year", "end_year"]]
-            .apply(
-                lambda row: pd.DataFrame(
-                    {
-                        "stock": [row["stock"]]
-                        * (row["end_year"] - row["start_year"])
-                        * 5,
-                        "year": list(
-                            np.repeat(range(row["start_year"], row["end_year"]), 5)
-                        ),
-                        # Include `quarter=0`
-                        "quarter": list(range(5))
-                        * (row["end_year"] - row["start_year"]),
-                    }
-                ),  # type: ignore
-                axis=1,
-            )
-            .to_list()
-        ),
-        on=["stock", "year", "quarter"],
-        how="outer",
-    ).sort_values(by=["stock", "year", "quarter"])
-    # Calculate difference of cashflow data
-    df.loc[
-        df["quarter"] == 0,
-        columns,
-    ] = 0
-    df[columns] = df.groupby(["stock", "year"])[columns].diff()
-    # Delete `quarter==0`
-    return df[df["quarter"] != 0]
+    df_diff[columns] = values.reshape(-1, len(columns))
+    # Delete stock-years out of the year range of all statements
+    return df_diff[np.repeat(covered, 4)].reset_index(drop=True)
 
 
 @singleton
 class EBITDA(object):
-    """EBITDA and EBIT (quarterly)"""
+    """EBITDA and EBIT (quarterly, year-to-date)"""
 
-    def __init__(
-        self,
-        file_name: str = "EBIT_EBITDA.csv",
-        columns: list[str] = [
-            "stock",
-            "year",
-            "quarter",
-            "EBIT",
-            "EBIT_TTM",
-            "EBITDA",
-            "EBITDA_TTM",
-        ],
-    ) -> None:
-        cashflow_columns: list[str] = ["EBIT", "EBIT_TTM", "EBITDA", "EBITDA_TTM"]
-        # Read EBITDA/EBIT data
-        self.df_ebitda: pd.DataFrame = pd.read_csv(
-            f"{Setting.cashflow_path}/{file_name}"
-        )
-        # Set columns in order
-        self.df_ebitda.columns = columns
-        # Convert data type
-        self.df_ebitda = self.df_ebitda.astype(
-            {
-                "stock": int,
-                "year": int,
-                "quarter": int,
-                "EBIT": float,
-                "EBIT_TTM": float,
-                "EBITDA": float,
-                "EBITDA_TTM": float,
-            }
-        )
+    def __init__(self) -> None:
+        self.df_ebitda: pd.DataFrame = Origin.load("ebitda")
         # Sort values
         self.df_ebitda = self.df_ebitda.sort_values(by=["stock", "year", "quarter"])
-        # Set start year
-        self.df_ebitda = self.df_ebitda[
-            self.df_ebitda["year"] >= Setting.sample_start_year
-        ]
-        # Calculate difference of EBIT & EBITDA
-        self.df_ebitda = cal_diff(df=self.df_ebitda, columns=cashflow_columns)
 
 
 @singleton
 class Income(object):
     """
-    Income statement (quarterly)
+    Income statement (quarterly, year-to-date)
     ------
     total_operating_income, operating_income, operating_profit, total_profit, net_profit
     """
 
-    def __init__(
-        self,
-        file_name: str = "income.csv",
-        columns: list[str] = [
-            "stock",
-            "year",
-            "quarter",
-            "total_operating_income",
-            "operating_income",
-            "operating_profit",
-            "total_profit",
-            "net_profit",
-        ],
-    ) -> None:
-        cashflow_columns: list[str] = [
-            "total_operating_income",
-            "operating_income",
-            "operating_profit",
-            "total_profit",
-            "net_profit",
-        ]
-        # Read income data
-        self.df_income: pd.DataFrame = pd.read_csv(
-            f"{Setting.cashflow_path}/{file_name}"
-        )
-        # Set columns in order
-        self.df_income.columns = columns
-        # Convert data type
-        self.df_income = self.df_income.astype(
-            {
-                "stock": int,
-                "year": int,
-                "quarter": int,
-                "total_operating_income": float,
-                "operating_income": float,
-                "operating_profit": float,
-                "total_profit": float,
-                "net_profit": float,
-            }
-        )
+    def __init__(self) -> None:
+        self.df_income: pd.DataFrame = Origin.load("income")
         # Sort values
         self.df_income = self.df_income.sort_values(by=["stock", "year", "quarter"])
-        # Set start year
-        self.df_income = self.df_income[
-            self.df_income["year"] >= Setting.sample_start_year
-        ]
-        # Calculate difference of income cashflow columns
-        self.df_income = cal_diff(df=self.df_income, columns=cashflow_columns)
 
 
 @singleton
 class Cashflow(object):
     """
-    Cashflow statement
+    Cashflow statement (quarterly, year-to-date)
     ------
     operating_cashflow, investing_cashflow, financing_cashflow, cash_increase
     """
 
-    def __init__(
-        self,
-        file_name: str = "cashflow.csv",
-        columns: list[str] = [
-            "stock",
-            "year",
-            "quarter",
-            "operating_cashflow",
-            "investing_cashflow",
-            "financing_cashflow",
-            "cash_increase",
-        ],
-    ) -> None:
-        cashflow_columns: list[str] = [
-            "operating_cashflow",
-            "investing_cashflow",
-            "financing_cashflow",
-            "cash_increase",
-        ]
-        # Read income data
-        self.df_cashflow: pd.DataFrame = pd.read_csv(
-            f"{Setting.cashflow_path}/{file_name}"
-        )
-        # Set columns in order
-        self.df_cashflow.columns = columns
-        # Convert data type
-        self.df_cashflow = self.df_cashflow.astype(
-            {
-                "stock": int,
-                "year": int,
-                "quarter": int,
-                "operating_cashflow": float,
-                "investing_cashflow": float,
-                "financing_cashflow": float,
-                "cash_increase": float,
-            }
-        )
+    def __init__(self) -> None:
+        self.df_cashflow: pd.DataFrame = Origin.load("cashflow")
         # Sort values
         self.df_cashflow = self.df_cashflow.sort_values(by=["stock", "year", "quarter"])
-        # Set start year
-        self.df_cashflow = self.df_cashflow[
-            self.df_cashflow["year"] >= Setting.sample_start_year
-        ]
-        # Calculate difference of income cashflow columns
-        self.df_cashflow = cal_diff(df=self.df_cashflow, columns=cashflow_columns)
 
 
-@Cache(file_path=f"{Setting.cache_path}/cashflow.csv", test=False)
+@Cache(
+    file_path=f"{Setting.cache_path}/cashflow.parquet",
+    test=False,
+    settings=["cashflow_path", "sample_start_year"],
+)
 def get_cashflow():
-    """Different measures of cashflow"""
-    return (
-        EBITDA()
-        .df_ebitda.merge(
+    """Different measures of cashflow (quarterly)"""
+    Origin.prefetch("ebitda", "income", "cashflow")
+    return cal_diff(
+        [
+            EBITDA().df_ebitda,
             Income().df_income,
-            on=["stock", "year", "quarter"],
-            how="outer",
-        )
-        .merge(
             Cashflow().df_cashflow,
-            on=["stock", "year", "quarter"],
-            how="outer",
-        )
+        ]
     )
 
 
 if __name__ == "__main__":
+    # A stock missing from a statement is not covered by it, even in a single year
+    df_single = cal_diff(
+        [
+            pd.DataFrame(
+                {"stock": [1, 2], "year": 2010, "quarter": 1, "A": [1.0, 2.0]}
+            ),
+            pd.DataFrame({"stock": [1], "year": 2010, "quarter": 1, "B": [3.0]}),
+        ]
+    )
+    assert df_single.loc[df_single["stock"] == 2, "B"].isna().all()
+    assert (df_single.loc[df_single["stock"] == 2, "quarter"] == [1, 2, 3, 4]).all()
     df_cashflow = get_cashflow()
     df_cashflow = get_cashflow()
     ic(get_cashflow())
@@ -14,35 +14,20 @@ from icecream import ic
 
 ic.configureOutput(prefix="")
 sys.path.append(str(Path.cwd()))
+from source.data.origin import Origin
 from source.modules.cache import Cache
 from source.modules.setting import Setting
 from source.modules.tools import singleton
 
 
 class BM(object):
-    def __init__(
-        self,
-        file_name: str = "BM.csv",
-        columns: list[str] = ["stock", "year", "quarter", "BM"],
-    ) -> None:
-        self.df_bm = pd.read_csv(f"{Setting.finance_path}/{file_name}")
-        self.df_bm.columns = columns
-        self.df_bm = self.df_bm.astype(
-            {"stock": int, "year": int, "quarter": int, "BM": float}
-        ).dropna()
+    def __init__(self) -> None:
+        self.df_bm: pd.DataFrame = Origin.load("bm").dropna()
 
 
 class Size(object):
-    def __init__(
-        self,
-        file_name: str = "size.csv",
-        columns: list[str] = ["stock", "year", "quarter", "month", "size"],
-    ) -> None:
-        self.df_size = pd.read_csv(f"{Setting.finance_path}/{file_name}")
-        self.df_size.columns = columns
-        self.df_size = self.df_size.astype(
-            {"stock": int, "year": int, "quarter": int, "month": int, "size": float}
-        ).dropna()
+    def __init__(self) -> None:
+        self.df_size: pd.DataFrame = Origin.load("size").dropna()
         self.df_size["size"] = np.log(self.df_size["size"])
 
 
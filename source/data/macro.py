@@ -18,6 +18,7 @@ from icecream import ic
 
 ic.configureOutput(prefix="")
 sys.path.append(str(Path.cwd()))
+from source.data.origin import Origin
 from source.modules.setting import Setting
 from source.modules.tools import singleton
 
@@ -28,25 +29,17 @@ class GDP(object):
     GDP: GDP_1, GDP_2, GDP_3 (quarterly)
     """
 
-    def __init__(
-        self,
-        file_name: str = "GDP.csv",
-        columns: list[str] = ["year", "quarter", "GDP", "GDP_1", "GDP_2", "GDP_3"],
-    ) -> None:
-        self.df_gdp: pd.DataFrame = pd.read_csv(f"{Setting.macro_path}/{file_name}")
-        self.df_gdp.columns = columns
-        self.df_gdp = self.df_gdp.astype(
-            {
-                "year": int,
-                "quarter": int,
-                "GDP": int,
-                "GDP_1": int,
-                "GDP_2": int,
-                "GDP_3": int,
-            }
+    def __init__(self) -> None:
+        self.df_origin: pd.DataFrame = Origin.load("gdp")
+        # GDP is counted in integers
+        self.df_origin = self.df_origin.astype(
+            {"GDP": int, "GDP_1": int, "GDP_2": int, "GDP_3": int}
         )
-        self.df_gdp = self.df_gdp[self.df_gdp["year"] >= Setting.sample_start_year]
-        self.df_gdp = self.df_gdp[["year", "quarter", Setting.gdp_column]].rename(
+
+    @property
+    def df_gdp(self) -> pd.DataFrame:
+        """GDP of `Setting.gdp_column` (selected on access, e.g. for sweeps)"""
+        return self.df_origin[["year", "quarter", Setting.gdp_column]].rename(
             columns={Setting.gdp_column: "GDP"}
         )
 
@@ -57,13 +50,8 @@ class RFR(object):
     Risk-free rate (monthly)
     """
 
-    def __init__(
-        self, file_name: str = "rfr.csv", columns: list[str] = ["year", "month", "rfr"]
-    ) -> None:
-        self.df_rfr: pd.DataFrame = pd.read_csv(f"{Setting.macro_path}/{file_name}")
-        self.df_rfr.columns = columns
-        self.df_rfr = self.df_rfr.astype({"year": int, "month": int, "rfr": float})
-        self.df_rfr = self.df_rfr[self.df_rfr["year"] >= Setting.sample_start_year]
+    def __init__(self) -> None:
+        self.df_rfr: pd.DataFrame = Origin.load("rfr")
 
 
 @singleton
@@ -72,30 +60,16 @@ class Inflation(object):
     Inflation rate: CPI and PPI (quarterly)
     """
 
-    def __init__(
-        self,
-        file_name: str = "inflation.csv",
-        columns: list[str] = ["year", "quarter", "CPI", "PPI"],
-    ) -> None:
-        self.df_inflation: pd.DataFrame = pd.read_csv(
-            f"{Setting.macro_path}/{file_name}"
-        )
-        self.df_inflation.columns = columns
-        self.df_inflation = self.df_inflation.astype(
-            {
-                "year": int,
-                "quarter": int,
-                "CPI": float,
-                "PPI": float,
-            }
+    def __init__(self) -> None:
+        self.df_origin: pd.DataFrame = Origin.load("inflation")
+        self.df_origin[["CPI", "PPI"]] = self.df_origin[["CPI", "PPI"]] / 100
+
+    @property
+    def df_inflation(self) -> pd.DataFrame:
+        """Inflation of `Setting.price_index` (selected on access, e.g. for sweeps)"""
+        return self.df_origin[["year", "quarter", Setting.price_index]].rename(
+            columns={Setting.price_index: "inflation"}
         )
-        self.df_inflation = self.df_inflation[
-            self.df_inflation["year"] >= Setting.sample_start_year
-        ]
-        self.df_inflation: pd.DataFrame = self.df_inflation[
-            ["year", "quarter", Setting.price_index]
-        ].rename(columns={Setting.price_index: "inflation"})
-        self.df_inflation['inflation'] = self.df_inflation['inflation']/100
 
 
 if __name__ == "__main__":
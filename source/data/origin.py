@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+# @Author: 昵称有六个字
+# @Date:   2023-10-19 17:20:41
+# @Last Modified by:   昵称有六个字
+# @Last Modified time: 2023-10-19 19:02:13
+"""
+Origin.prefetch("income", "cashflow") \n
+df = Origin.load("income")
+"""
+
+import os
+import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable
+
+import pandas as pd
+from icecream import ic
+
+ic.configureOutput(prefix="")
+sys.path.append(str(Path.cwd()))
+from source.modules.dtypes import compact
+from source.modules.lineage import Lineage
+from source.modules.setting import Setting
+
+# Reduce a chunk of an origin file, e.g. filter and aggregate it
+Reduce = Callable[[pd.DataFrame], pd.DataFrame]
+
+
+class Schema(object):
+    """
+    Schema of an origin CSV file.
+    --------
+
+    Args:
+    --------
+        directory (str): The `Setting` attribute of the directory, e.g. "basic_path".
+        file_name (str): The file name, e.g. "market_type.csv".
+        columns (list[str]): Column names in order (the header is replaced).
+        dtypes (dict[str, Any] | None): Data types applied while parsing, None → none.
+        date_columns (list[str] | None): Columns parsed into datetime, None → none.
+        usecols (list[str] | None): Columns to keep, None → all.
+        year_column (str | None): Keep rows from `Setting.sample_start_year` on.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        file_name: str,
+        columns: list[str],
+        dtypes: dict[str, Any] | None = None,
+        date_columns: list[str] | None = None,
+        usecols: list[str] | None = None,
+        year_column: str | None = None,
+    ) -> None:
+        self.directory: str = directory
+        self.file_name: str = file_name
+        self.columns: list[str] = columns
+        self.dtypes: dict[str, Any] = {} if dtypes is None else dtypes
+        self.date_columns: list[str] = [] if date_columns is None else date_columns
+        self.usecols: list[str] = columns if usecols is None else usecols
+        self.year_column: str | None = year_column
+
+    @property
+    def path(self) -> str:
+        return f"{getattr(Setting, self.directory)}/{self.file_name}"
+
+    def set_start_year(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.year_column is None:
+            return df
+        return df[df[self.year_column] >= Setting.sample_start_year]
+
+    def read(self, reduce: Reduce | None = None) -> pd.DataFrame:
+        """
+        Parse the file with dtypes and dates, and set the sample start year
+        ------
+        The compact dtype policy is applied to the result (see `compact`). \n
+        With `reduce`, the file is streamed in chunks of `Setting.chunk_size` rows \n
+        and only the reduced chunks are kept, so memory is bounded by the chunk size.
+        """
+        kwargs: dict[str, Any] = {
+            "header": 0,
+            "names": self.columns,
+            "usecols": self.usecols,
+            "dtype": {k: v for k, v in self.dtypes.items() if k in self.usecols},
+            "parse_dates": [c for c in self.date_columns if c in self.usecols],
+        }
+        if reduce is None or Setting.chunk_size is None:
+            df: pd.DataFrame = self.set_start_year(pd.read_csv(self.path, **kwargs))
+            return compact(df if reduce is None else reduce(df))
+        with pd.read_csv(self.path, chunksize=Setting.chunk_size, **kwargs) as reader:
+            return pd.concat(
+                [compact(reduce(self.set_start_year(chunk))) for chunk in reader]
+            )
+
+
+# fmt: off
+SCHEMAS: dict[str, Schema] = {
+    # & Basic information of stocks
+    "market_type": Schema(
+        "basic_path", "market_type.csv", ["stock", "market_type"],
+        dtypes={"stock": int, "market_type": int},
+    ),
+    "listed_delisted": Schema(
+        "basic_path", "listed_delisted.csv", ["stock", "listed_date", "delisted_date"],
+        dtypes={"stock": int}, date_columns=["listed_date", "delisted_date"],
+    ),
+    "annotation_date": Schema(
+        "basic_path", "annotation_date.csv", ["stock", "year", "quarter", "annotation_date"],
+        dtypes={"stock": int, "year": int, "quarter": int},
+        date_columns=["annotation_date"], year_column="year",
+    ),
+    "industry_classification": Schema(
+        "basic_path", "industry_classification.csv", ["stock", "implement_date", "industry_code"],
+        dtypes={"stock": int, "industry_code": int}, date_columns=["implement_date"],
+    ),
+    # & Cash flow
+    "ebitda": Schema(
+        "cashflow_path", "EBIT_EBITDA.csv",
+        ["stock", "year", "quarter", "EBIT", "EBIT_TTM", "EBITDA", "EBITDA_TTM"],
+        dtypes={
+            "stock": int, "year": int, "quarter": int,
+            "EBIT": float, "EBIT_TTM": float, "EBITDA": float, "EBITDA_TTM": float,
+        },
+        year_column="year",
+    ),
+    "income": Schema(
+        "cashflow_path", "income.csv",
+        [
+            "stock", "year", "quarter", "total_operating_income", "operating_income",
+            "operating_profit", "total_profit", "net_profit",
+        ],
+        dtypes={
+            "stock": int, "year": int, "quarter": int,
+            "total_operating_income": float, "operating_income": float,
+            "operating_profit": float, "total_profit": float, "net_profit": float,
+        },
+        year_column="year",
+    ),
+    "cashflow": Schema(
+        "cashflow_path", "cashflow.csv",
+        [
+            "stock", "year", "quarter", "operating_cashflow", "investing_cashflow",
+            "financing_cashflow", "cash_increase",
+        ],
+        dtypes={
+            "stock": int, "year": int, "quarter": int,
+            "operating_cashflow": float, "investing_cashflow": float,
+            "financing_cashflow": float, "cash_increase": float,
+        },
+        year_column="year",
+    ),
+    # & Macro-indicators
+    "gdp": Schema(
+        "macro_path", "GDP.csv", ["year", "quarter", "GDP", "GDP_1", "GDP_2", "GDP_3"],
+        dtypes={
+            "year": int, "quarter": int,
+            "GDP": float, "GDP_1": float, "GDP_2": float, "GDP_3": float,
+        },
+        year_column="year",
+    ),
+    "rfr": Schema(
+        "macro_path", "rfr.csv", ["year", "month", "rfr"],
+        dtypes={"year": int, "month": int, "rfr": float}, year_column="year",
+    ),
+    "inflation": Schema(
+        "macro_path", "inflation.csv", ["year", "quarter", "CPI", "PPI"],
+        dtypes={"year": int, "quarter": int, "CPI": float, "PPI": float},
+        year_column="year",
+    ),
+    # & Trade
+    "st": Schema(
+        "trade_path", "st.csv", ["stock", "date", "trade_state"],
+        dtypes={"stock": int}, date_columns=["date"],
+    ),
+    "return": Schema(
+        "trade_path", "return.csv",
+        [
+            "stock", "date", "market_type", "traded_value", "total_value",
+            "return_with_dividend", "return_without_dividend",
+        ],
+        dtypes={
+            "stock": int, "traded_value": float, "total_value": float,
+            "return_with_dividend": float, "return_without_dividend": float,
+        },
+        date_columns=["date"],
+    ),
+    # & Finance
+    "bm": Schema(
+        "finance_path", "BM.csv", ["stock", "year", "quarter", "BM"],
+        dtypes={"stock": int, "year": int, "quarter": int, "BM": float},
+    ),
+    "size": Schema(
+        "finance_path", "size.csv", ["stock", "year", "quarter", "month", "size"],
+        dtypes={"stock": int, "year": int, "quarter": int, "month": int, "size": float},
+    ),
+}
+# fmt: on
+
+
+class Origin(object):
+    """
+    Concurrent loader of origin CSV files.
+    --------
+    `prefetch` starts parsing files in a thread pool (`Setting.origin_workers`), \n
+    `load` waits for a file (parsing it now if it was not prefetched), records it \n
+    into the lineage of the calling computation and hands the frame over. \n
+    Files loaded already are not prefetched again (their singletons hold them). \n
+    Large files are streamed through `reduce` (see `Schema.read`), which must be \n
+    the same for `prefetch` and `load`.
+
+    Usages:
+    --------
+        >>> Origin.prefetch("ebitda", "income", "cashflow")
+        >>> df_income = Origin.load("income")
+        >>> df_st = Origin.load("st", reduce=reduce_st)
+    """
+
+    futures: dict[str, Future] = {}
+    loaded: set[str] = set()
+    lock: threading.Lock = threading.Lock()
+    executor: ThreadPoolExecutor | None = None
+    # The process that owns the executor (worker threads do not survive a fork)
+    pid: int | None = None
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        if cls.executor is None or cls.pid != os.getpid():
+            cls.executor = ThreadPoolExecutor(
+                max_workers=Setting.origin_workers, thread_name_prefix="origin"
+            )
+            cls.futures, cls.loaded, cls.pid = {}, set(), os.getpid()
+        return cls.executor
+
+    @classmethod
+    def prefetch(cls, *names: str, reduce: Reduce | None = None) -> None:
+        """Start parsing the files in the background"""
+        with cls.lock:
+            executor: ThreadPoolExecutor = cls.get_executor()
+            for name in names:
+                if name not in cls.futures and name not in cls.loaded:
+                    cls.futures[name] = executor.submit(SCHEMAS[name].read, reduce)
+
+    @classmethod
+    def load(cls, name: str, reduce: Reduce | None = None) -> pd.DataFrame:
+        """Parsed origin file (the prefetched frame is handed over only once)"""
+        with cls.lock:
+            cls.loaded.discard(name)
+        cls.prefetch(name, reduce=reduce)
+        with cls.lock:
+            future: Future = cls.futures.pop(name)
+            cls.loaded.add(name)
+        Lineage.record_origin(SCHEMAS[name].path)
+        return future.result()
+
+
+if __name__ == "__main__":
+    Origin.prefetch(*SCHEMAS)
+    for name in SCHEMAS:
+        ic(name, Origin.load(name).dtypes)
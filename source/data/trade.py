@@ -18,27 +18,52 @@ from icecream import ic
 ic.configureOutput(prefix="")
 sys.path.append(str(Path.cwd()))
 from source.data.macro import RFR
+from source.data.origin import Origin
 from source.modules.cache import Cache
 from source.modules.setting import Setting
 from source.modules.tools import singleton
 
 
+def reduce_st(df_st: pd.DataFrame) -> pd.DataFrame:
+    """Count ST trading days of each stock in each quarter (a chunk of `st.csv`)"""
+    return (
+        df_st.assign(
+            year=df_st["date"].dt.year,
+            quarter=df_st["date"].dt.quarter,
+            # `trade_state` determination
+            is_st=df_st["trade_state"] != 1,
+        )
+        .groupby(["stock", "year", "quarter"])[["is_st"]]
+        .sum()
+        .reset_index(drop=False)
+    )
+
+
+def reduce_ret(df_ret: pd.DataFrame) -> pd.DataFrame:
+    """Filter markets and sample years (a chunk of `return.csv`)"""
+    # Delete market_type not in [1, 4]
+    df_ret = df_ret[df_ret["market_type"].isin(Setting.market_list)].drop(
+        columns="market_type"
+    )
+    # Generate year, quarter and month
+    df_ret = df_ret.assign(
+        year=df_ret["date"].dt.year,
+        quarter=df_ret["date"].dt.quarter,
+        month=df_ret["date"].dt.month,
+    )
+    # Set sample start year
+    return df_ret[
+        df_ret["year"]
+        >= Setting.sample_start_year + Setting.sample_periods // Setting.shift_period
+    ].drop(columns="date")
+
+
 @singleton
 class ST(object):
-    def __init__(
-        self, file_name="st.csv", columns: list[str] = ["stock", "date", "trade_state"]
-    ) -> None:
-        self.df_st: pd.DataFrame = pd.read_csv(f"{Setting.trade_path}/{file_name}")
-        self.df_st.columns = columns
-        self.df_st["date"] = pd.to_datetime(self.df_st["date"])
-        self.df_st["year"] = self.df_st["date"].dt.year
-        self.df_st["quarter"] = self.df_st["date"].dt.quarter
-        # `trade_state` determination
-        self.df_st["is_st"] = self.df_st["trade_state"] != 1
-        self.df_st = self.df_st.drop(columns="trade_state")
-        # Generate is_quarter_st data
-        self.df_st = (
-            self.df_st.astype({"stock": int})
+    def __init__(self) -> None:
+        # Quarters split across chunks are summed up again
+        self.df_st: pd.DataFrame = (
+            Origin.load("st", reduce=reduce_st)
             .groupby(["stock", "year", "quarter"])[["is_st"]]
             .sum()
             .astype({"is_st": bool})
@@ -48,45 +73,12 @@ class ST(object):
 
 
 class Ret(object):
-    def __init__(
-        self,
-        file_name: str = "return.csv",
-        columns: list[str] = [
-            "stock",
-            "date",
-            "market_type",
-            "traded_value",
-            "total_value",
-            "return_with_dividend",
-            "return_without_dividend",
-        ],
-    ) -> None:
-        self.df_ret = pd.read_csv(f"{Setting.trade_path}/{file_name}")
-        self.df_ret.columns = columns
-        self.delete_market()
-        self.type_convert()
-        # Set sample start year
-        self.df_ret = self.df_ret[
-            self.df_ret["year"]
-            >= Setting.sample_start_year
-            + Setting.sample_periods // Setting.shift_period
-        ].drop(columns="date")
+    def __init__(self) -> None:
+        # Stream monthly returns, keeping the sample markets and years only
+        self.df_ret: pd.DataFrame = Origin.load("return", reduce=reduce_ret)
         self.delete_st()
         self.rfr_adjust()
 
-    def delete_market(self) -> None:
-        """'Delete market_type not in [1, 4]"""
-        self.df_ret = self.df_ret[
-            self.df_ret["market_type"].isin(Setting.market_list)
-        ].drop(columns="market_type")
-
-    def type_convert(self) -> None:
-        """Generate year and quarter"""
-        self.df_ret["date"] = pd.to_datetime(self.df_ret["date"])
-        self.df_ret["year"] = self.df_ret["date"].dt.year
-        self.df_ret["quarter"] = self.df_ret["date"].dt.quarter
-        self.df_ret["month"] = self.df_ret["date"].dt.month
-
     def delete_st(self) -> None:
         """Delete ST data"""
         # Merge ST data
@@ -117,47 +109,76 @@ class Ret(object):
         )
 
 
+@Cache(
+    file_path=f"{Setting.cache_path}/stock_return.parquet",
+    test=False,
+    settings=[
+        "trade_path",
+        "macro_path",
+        "sample_start_year",
+        "sample_periods",
+        "shift_period",
+        "market_list",
+    ],
+)
+def get_stock_return():
+    """
+    Monthly excess returns of all stocks
+    ------
+    One panel for every `StockReturn`: the weighting scheme and the return column \n
+    are chosen when it is read (see `StockReturn.get_df_ret`).
+    """
+    Origin.prefetch("return", reduce=reduce_ret)
+    Origin.prefetch("st", reduce=reduce_st)
+    Origin.prefetch("rfr")
+    return (
+        Ret()
+        .df_ret[
+            [
+                "stock",
+                "year",
+                "quarter",
+                "month",
+                "traded_value",
+                "total_value",
+                "return_with_dividend",
+                "return_without_dividend",
+            ]
+        ]
+        .dropna()
+    )
+
+
 class StockReturn(object):
     def __init__(self, weighting_scheme="traded_value", with_dividend=True) -> None:
         self.weighting_scheme = weighting_scheme
         self.with_dividend = with_dividend
 
-    @Cache(file_path=f"{Setting.cache_path}/stock_return.csv", test=False)
-    def get_stock_return(self):
-        return (
-            Ret()
-            .df_ret[
-                [
-                    "stock",
-                    "year",
-                    "quarter",
-                    "month",
-                    "traded_value",
-                    "total_value",
-                    "return_with_dividend",
-                    "return_without_dividend",
-                ]
-            ]
-            .dropna()
-        )
-
-    @property
-    def df_ret(
-        self,
-    ):
-        df_ret = self.get_stock_return()[  # type:ignore
-            [
+    def get_df_ret(self, filters: dict | None = None) -> pd.DataFrame:
+        """
+        Stock return with the chosen weighting scheme and return column
+        #& `filters` are pushed down into the cache reader, e.g. {"year": (2015, 2020)}.
+        """
+        df_ret = get_stock_return(  # type: ignore
+            columns=[
                 "stock",
                 "year",
                 "quarter",
                 "month",
                 self.weighting_scheme,
                 f"return_with{'' if self.with_dividend else 'out'}_dividend",
-            ]
-        ]
+            ],
+            filters=filters,
+        )
         df_ret.columns = ["stock", "year", "quarter", "month", "size", "return"]
         return df_ret
 
+    @property
+    def df_ret(
+        self,
+    ):
+        return self.get_df_ret()
+
 
 if __name__ == "__main__":
     # df_st = ST().df_st
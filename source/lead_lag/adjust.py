@@ -15,6 +15,7 @@ from icecream import ic
 ic.configureOutput(prefix="")
 sys.path.append(str(Path.cwd()))
 from source.data.macro import GDP, Inflation
+from source.modules.tools import lazy_attribute
 
 
 class AdjustFactory(object):
@@ -24,11 +25,16 @@ class AdjustFactory(object):
 
 
 class InflationAdjust(AdjustFactory):
-    df_inflation: pd.DataFrame = Inflation().df_inflation
+    @lazy_attribute
+    def inflation(cls) -> Inflation:
+        return Inflation()
 
     def inflation_adjust(self) -> None:
         self.df_adjust = pd.merge(
-            self.df_adjust, self.df_inflation, on=["year", "quarter"], how="left"
+            self.df_adjust,
+            self.inflation.df_inflation,
+            on=["year", "quarter"],
+            how="left",
         ).dropna(subset="inflation")
         self.df_adjust[self.adjust_column] = (
             self.df_adjust[self.adjust_column] / self.df_adjust["inflation"]
@@ -68,7 +74,7 @@ class Adjust(InflationAdjust, SeasonalAdjust):
 if __name__ == "__main__":
     df_gdp = GDP().df_gdp
     # samples = Samples()
-    # sample = next(samples)
+    # sample = samples[0]
     # df_adjust = sample.df_dict["EBITDA"]
     # df_adjust = Adjust(df_adjust, "EBITDA").adjust_result
     df_adjust = Adjust(df_gdp, "GDP").adjust_result
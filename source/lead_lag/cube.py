@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+# @Author: 昵称有六个字
+# @Date:   2023-10-21 16:20:05
+# @Last Modified by:   昵称有六个字
+# @Last Modified time: 2023-10-21 19:48:32
+"""
+CorrCube.save(directory, windows, measures, lags) \n
+cube = CorrCube(directory) \n
+cube["EBITDA"], cube.to_frame("EBITDA")
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from icecream import ic
+
+ic.configureOutput(prefix="")
+sys.path.append(str(Path.cwd()))
+from source.modules.tools import cp, ordinal_to_period, period_to_ordinal
+
+# Correlations of a window: {measure: (industry codes, correlations (industry × lag))}
+WindowCorr = dict[str, tuple[np.ndarray, np.ndarray]]
+
+
+class CorrCube(object):
+    """
+    Memory-mapped cube of absolute cross-correlations.
+    --------
+    Dimensions: period × industry × measure × lag (NaN → no correlation). \n
+    The cube is stored in a directory as "corr.npy", which is opened with \n
+    `mmap_mode="r"` (only the blocks used are read), and "axes.json", which holds \n
+    the labels of the dimensions (periods as quarter ordinals).
+
+    Usages:
+    --------
+        >>> cube = CorrCube(directory)
+        >>> cube["EBITDA"]  # period × industry × lag
+        >>> cube.to_frame("EBITDA")  # period, industry_code, EBITDA(-2), ..., EBITDA(2)
+    """
+
+    corr_file: str = "corr.npy"
+    axes_file: str = "axes.json"
+
+    def __init__(self, directory: str | Path) -> None:
+        self.directory: Path = Path(directory)
+        if not (self.directory / self.axes_file).exists():
+            raise FileNotFoundError(f"No correlation cube in {self.directory}")
+        axes: dict[str, list] = json.loads(
+            (self.directory / self.axes_file).read_text()
+        )
+        self.periods: pd.PeriodIndex = pd.PeriodIndex(
+            ordinal_to_period(np.asarray(axes["period"], dtype=np.int64))
+        )
+        self.industry_codes: np.ndarray = np.asarray(axes["industry_code"])
+        self.measures: list[str] = axes["measure"]
+        self.lags: np.ndarray = np.asarray(axes["lag"])
+        self.corr: np.ndarray = np.load(self.directory / self.corr_file, mmap_mode="r")
+
+    def __repr__(self) -> str:
+        return (
+            f"CorrCube({self.directory}): {len(self.periods)} periods "
+            f"× {len(self.industry_codes)} industries × {len(self.measures)} measures "
+            f"× {len(self.lags)} lags ({self.corr.dtype})"
+        )
+
+    def __getitem__(self, measure: str) -> np.ndarray:
+        """Correlations of a measure: period × industry × lag"""
+        return self.corr[:, :, self.measures.index(measure)]
+
+    def to_frame(self, measure: str) -> pd.DataFrame:
+        """
+        Correlations of a measure in the layout of `LeadLag.cal_corr`
+        ------
+        One row per period and industry (without correlations → dropped), \n
+        with one column per lag, e.g. EBITDA(-2), ..., EBITDA, ..., EBITDA(2).
+        """
+        corr: np.ndarray = self[measure].reshape(-1, len(self.lags))
+        keep: np.ndarray = ~np.isnan(corr).all(axis=1)
+        df: pd.DataFrame = pd.DataFrame(
+            corr[keep],
+            columns=[f"{measure}({lag})" if lag != 0 else measure for lag in self.lags],
+        )
+        df.insert(0, "period", np.repeat(self.periods, len(self.industry_codes))[keep])
+        df.insert(
+            1, "industry_code", np.tile(self.industry_codes, len(self.periods))[keep]
+        )
+        return df
+
+    @classmethod
+    def save(
+        cls,
+        directory: str | Path,
+        windows: list[tuple[pd.Period, WindowCorr]],
+        measures: list[str],
+        lags: np.ndarray,
+        dtype: str = "float64",
+    ) -> "CorrCube":
+        """
+        Write the cube of the windows.
+        --------
+        The old axes are removed first, and the files are written under temporary \n
+        names and then moved into place, "axes.json" last, so a cube is complete \n
+        whenever its axes exist.
+
+        Args:
+        --------
+            directory (str | Path): Directory of the cube.
+            windows (list[tuple[pd.Period, WindowCorr]]): Correlations of every window.
+            measures (list[str]): Cashflow measures.
+            lags (np.ndarray): Shift periods.
+            dtype (str): "float64" or "float32".
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        (directory / cls.axes_file).unlink(missing_ok=True)
+        industry_codes: np.ndarray = np.unique(
+            np.concatenate(
+                [np.asarray(codes) for _, corr in windows for codes, _ in corr.values()]
+                or [np.empty(0, dtype=np.int64)]
+            )
+        )
+        shape: tuple[int, ...] = (
+            len(windows),
+            len(industry_codes),
+            len(measures),
+            len(lags),
+        )
+        cp(f"Save correlation cube {shape} to {directory}...", color="blue")
+        temp_corr: Path = directory / f".{os.getpid()}.tmp.{cls.corr_file}"
+        corr: np.ndarray = np.lib.format.open_memmap(
+            temp_corr, mode="w+", dtype=dtype, shape=shape
+        )
+        corr[:] = np.nan
+        for p, (_, window_corr) in enumerate(windows):
+            for m, measure in enumerate(measures):
+                codes, block = window_corr[measure]
+                corr[p, np.searchsorted(industry_codes, codes), m] = block
+        corr.flush()
+        del corr
+        os.replace(temp_corr, directory / cls.corr_file)
+        axes: dict[str, list] = {
+            "period": [int(period_to_ordinal(period)) for period, _ in windows],
+            "industry_code": industry_codes.tolist(),
+            "measure": list(measures),
+            "lag": np.asarray(lags).tolist(),
+        }
+        temp_axes: Path = directory / f".{os.getpid()}.tmp.{cls.axes_file}"
+        temp_axes.write_text(json.dumps(axes))
+        os.replace(temp_axes, directory / cls.axes_file)
+        return cls(directory)
+
+
+if __name__ == "__main__":
+    from tempfile import TemporaryDirectory
+
+    lags = np.arange(-2, 3)
+    windows: list[tuple[pd.Period, WindowCorr]] = [
+        (
+            pd.Period(f"2010Q{q}"),
+            {"EBITDA": (np.array([1, 3]), np.random.default_rng(q).random((2, 5)))},
+        )
+        for q in range(1, 5)
+    ]
+    with TemporaryDirectory() as directory:
+        cube = CorrCube.save(directory, windows, ["EBITDA"], lags, dtype="float32")
+        ic(cube, cube.to_frame("EBITDA"))
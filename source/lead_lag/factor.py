@@ -5,11 +5,19 @@
 # @Last Modified time: 2023-10-07 17:00:57
 """
 Factor().lead_lag() \n
+Factor().lead_lag(columns=["period", "industry_code", "LL_max(EBITDA)"]) \n
+Factor().corr_cube() \n
+Factor().update_lead_lag()
 """
 
+import hashlib
+import json
+import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from time import time
+from typing import Any
 
 import numpy as np
 import pandas as pd
@@ -18,25 +26,55 @@ from icecream import ic
 ic.configureOutput(prefix="")
 sys.path.append(str(Path.cwd()))
 
-from source.data.macro import GDP
-from source.lead_lag.sample import Samples
-from source.modules.cache import Cache, cp
+from source.data.macro import GDP, Inflation
+from source.lead_lag.adjust import Adjust
+from source.lead_lag.cube import CorrCube, WindowCorr
+from source.lead_lag.kernel import ll_statistics, rolling_corr
+from source.lead_lag.sample import OriginalSample, Samples
+from source.modules.cache import Cache, CacheStats, FileLock, cp
+from source.modules.lineage import Lineage
 from source.modules.setting import Setting
 from source.modules.structure import LLWindow
-from source.modules.tools import singleton
+from source.modules.tools import period_to_ordinal, quarter_ordinal, singleton
+
+# Lead-lag table of a window, and its correlations for the cube (if any)
+WindowResult = tuple[pd.DataFrame, tuple[pd.Period, WindowCorr] | None]
 
 
 class LeadLag(object):
     def __init__(self, sample: LLWindow):
         self.sample: LLWindow = sample
+        self.shift_periods: np.ndarray = np.arange(
+            -Setting.shift_period, Setting.shift_period + 1
+        )
 
     def factor(self):
         self.cal_diff()
-        self.generate_shift_data()
+        self.name_shift_columns()
         self.cal_corr()
         self.cal_ll()
         self.add_period_column()
 
+    @property
+    def df_ll(self) -> pd.DataFrame:
+        """Lead-lag table of the window (all cashflow measures)"""
+        t: float = time()
+        ic(self.sample)
+        self.factor()
+        df_ll = pd.DataFrame()
+        for cashflow_column in Setting.cashflow_measures:
+            if df_ll.empty:
+                df_ll: pd.DataFrame = self.sample.df_dict[cashflow_column]
+            else:
+                df_ll = pd.merge(
+                    df_ll,
+                    self.sample.df_dict[cashflow_column],
+                    on=["industry_code", "period"],
+                    how="outer",
+                )
+        cp(f"cost time:{time() - t:.4f}s", color="red")
+        return df_ll
+
     def cal_diff(self) -> None:
         """Calculates the difference of Cashflow and GDP"""
         cp(
@@ -53,90 +91,49 @@ class LeadLag(object):
                 cashflow_column
             ].dropna()
 
-    def generate_shift_data(self):
-        """Generate shift columns for cashflow"""
-        cp(
-            f"Generate {Setting.shift_period*2} shift columns for cashflow...",
-            color="yellow",
-        )
-        self.corr_columns_dict: dict[str, list[str]] = {}
-        for cash_column in Setting.cashflow_measures:
-            corr_columns: list[str] = []
-            # Name and generate shift data
-            for shift_period in range(-Setting.shift_period, Setting.shift_period + 1):
-                # Name shift columns
-                corr_column: str = (
-                    f"{cash_column}{f'({shift_period})' if shift_period!=0 else ''}"
-                )
-                corr_columns.append(corr_column)
-                # Generate shift columns
-                self.sample.df_dict[cash_column][corr_column] = (
-                    self.sample.df_dict[cash_column]
-                    .groupby("industry_code")[cash_column]
-                    .shift(shift_period)
-                )
-            # Save shift columns
-            self.corr_columns_dict[cash_column] = corr_columns
+    def name_shift_columns(self) -> None:
+        """Name the shift columns of cashflow, e.g. EBITDA(-2), ..., EBITDA, ..., EBITDA(2)"""
+        self.corr_columns_dict: dict[str, list[str]] = {
+            cash_column: [
+                f"{cash_column}{f'({shift_period})' if shift_period!=0 else ''}"
+                for shift_period in self.shift_periods
+            ]
+            for cash_column in Setting.cashflow_measures
+        }
 
     def cal_corr(self) -> None:
-        """Calculate cross-correlation of dimension 1+2J on a rolling window with T"""
+        """
+        Calculate cross-correlation of dimension 1+2J on a rolling window with T
+        --------
+        All shifts of a measure are correlated with GDP at once (see `rolling_corr`), \n
+        the shift columns are not generated.
+        """
         cp(
             f"Calculate cross-correlation of dimension {1+2*Setting.shift_period} on a rolling window with {Setting.window_period} periods...",
             color="yellow",
         )
+        self.corr_dict: WindowCorr = {}
         for cash_column in Setting.cashflow_measures:
-            self.sample.df_dict[cash_column] = (
-                self.sample.df_dict[cash_column]
-                .drop(columns=["year", "quarter", "GDP"])
-                .groupby("industry_code")
-                .rolling(window=Setting.window_period)
-                .corr(self.sample.df_dict[cash_column]["GDP"])
-                .apply(np.abs)  # Take the absolute value of cross-correlation
-                .reset_index()
-                .dropna()
-                .drop(columns="level_1")
+            df_cash: pd.DataFrame = self.sample.df_dict[cash_column]
+            industry_codes, corr = rolling_corr(
+                codes=df_cash["industry_code"].to_numpy(),
+                x=df_cash[cash_column].to_numpy(dtype=float),
+                y=df_cash["GDP"].to_numpy(dtype=float),
+                lags=self.shift_periods,
+                window=Setting.window_period,
             )
-
-    def shift_name_to_period(self, column_name: str) -> int:
-        """Convert shift name to period number"""
-        return (
-            int(column_name[column_name.find("(") + 1 : column_name.find(")")])
-            if "(" in column_name
-            else 0
-        )
-
-    def cal_ll_max(self, df_cash: pd.DataFrame, cash_columns: list[str]):
-        """
-        Maximum cross-correlation
-        #& for self.cal_ll()
-        """
-        return (
-            df_cash[cash_columns]
-            .idxmax(axis=1)
-            .map(lambda x: self.shift_name_to_period(x))
-        )
-
-    def cal_ll_average(self, df_cash: pd.DataFrame, cash_columns: list[str]):
-        """
-        Industry-level weighted average of leads and lags
-        #& for self.cal_ll()
-        """
-        return sum(
-            df_cash[cash_column] * self.shift_name_to_period(cash_column)
-            for cash_column in cash_columns
-        ) / df_cash[cash_columns].sum(axis=1)
-
-    def cal_ll_industry(self, df_cash: pd.DataFrame, cash_columns: list[str]):
-        """
-        Cross-industry of leads and lags
-        #& for self.cal_ll()
-        """
-        return sum(
-            df_cash[cash_column]
-            * self.shift_name_to_period(cash_column)
-            / df_cash[cash_column].sum()
-            for cash_column in cash_columns
-        )
+            # Take the absolute value of cross-correlation
+            self.corr_dict[cash_column] = (industry_codes, np.abs(corr))
+            df_corr: pd.DataFrame = pd.DataFrame(
+                self.corr_dict[cash_column][1],
+                columns=self.corr_columns_dict[cash_column],
+            )
+            df_corr.insert(
+                0,
+                "industry_code",
+                pd.Series(industry_codes, dtype=df_cash["industry_code"].dtype),
+            )
+            self.sample.df_dict[cash_column] = df_corr
 
     def cal_ll(self) -> None:
         """
@@ -145,32 +142,30 @@ class LeadLag(object):
         1. Maximum cross-correlation
         2. Industry-level weighted average of leads and lags
         3. Cross-industry of leads and lags
+
+        The correlations of all measures are padded into one (measure × row × lag) \n
+        block and reduced at once (see `ll_statistics`).
         """
         cp("Calculate leads and lags indicator...", color="yellow")
-        for cash_column in Setting.cashflow_measures:
-            df_cash: pd.DataFrame = self.sample.df_dict[cash_column]
-            cash_columns: list[str] = self.corr_columns_dict[cash_column]
-            # 1. Maximum cross-correlation
-            self.sample.df_dict[cash_column][
-                f"LL_max({cash_column})"
-            ] = self.cal_ll_max(
-                df_cash=df_cash,
-                cash_columns=cash_columns,
-            )
-            # 2.Industry-level weighted average of leads and lags
-            self.sample.df_dict[cash_column][
-                f"LL_average({cash_column})"
-            ] = self.cal_ll_average(
-                df_cash=df_cash,
-                cash_columns=cash_columns,
-            )
-            # 3.Cross-industry of leads and lags
-            self.sample.df_dict[cash_column][
-                f"LL_industry({cash_column})"
-            ] = self.cal_ll_industry(
-                df_cash=df_cash,
-                cash_columns=cash_columns,
-            )
+        blocks: list[np.ndarray] = [
+            self.corr_dict[cash_column][1] for cash_column in Setting.cashflow_measures
+        ]
+        corr: np.ndarray = np.full(
+            (
+                len(blocks),
+                max((len(block) for block in blocks), default=0),
+                len(self.shift_periods),
+            ),
+            np.nan,
+        )
+        for m, block in enumerate(blocks):
+            corr[m, : len(block)] = block
+        statistics: dict[str, np.ndarray] = ll_statistics(corr, self.shift_periods)
+        for m, cash_column in enumerate(Setting.cashflow_measures):
+            for name, values in statistics.items():
+                self.sample.df_dict[cash_column][f"{name}({cash_column})"] = values[
+                    m, : len(blocks[m])
+                ]
 
     def add_period_column(self) -> None:
         """Add period column"""
@@ -191,47 +186,364 @@ class LeadLag(object):
 class Factor(object):
     """Lead and Lag Factor"""
 
-    def __init__(self) -> None:
-        self.df_ll = self.lead_lag()
+    @property
+    def df_ll(self) -> pd.DataFrame:
+        """
+        The whole lead-lag table
+        #& Use `Factor().lead_lag(columns=..., filters=...)` to read a part of it.
+        """
+        return self.lead_lag()  # type: ignore
 
-    @Cache(file_path=f"{Setting.cache_path}/lead_lag.csv", test=False)
+    @Cache(
+        file_path=f"{Setting.cache_path}/lead_lag.parquet",
+        test=False,
+        settings=[
+            "basic_path",
+            "cashflow_path",
+            "macro_path",
+            "sample_start_year",
+            "window_period",
+            "shift_period",
+            "sample_periods",
+            "market_list",
+            "delay_max_period",
+            "is_balance_panel",
+            "price_index",
+            "gdp_column",
+            "cashflow_measures",
+            "corr_cube",
+            "corr_cube_float32",
+        ],
+    )
     def lead_lag(self) -> pd.DataFrame:
         t_all: float = time()
-        ll_list = []
-        for sample in Samples():
-            t: float = time()
-            ic(sample)
-            ll = LeadLag(sample=sample)
-            ll.factor()
-            df_ll = pd.DataFrame()
-            for cashflow_column in Setting.cashflow_measures:
-                if df_ll.empty:
-                    df_ll: pd.DataFrame = ll.sample.df_dict[cashflow_column]
-                else:
-                    df_ll = pd.merge(
-                        df_ll,
-                        ll.sample.df_dict[cashflow_column],
-                        on=["industry_code", "period"],
-                        how="outer",
-                    )
-            ll_list.append(df_ll)
-            cp(f"cost time:{time() - t:.4f}s", color="red")
+        results: list[WindowResult] = self.compute_windows(
+            OriginalSample().period_indexes
+        )
+        if Setting.corr_cube:
+            CorrCube.save(
+                self.corr_cube_directory,
+                windows=[window_corr for _, window_corr in results],  # type: ignore
+                measures=Setting.cashflow_measures,
+                lags=np.arange(-Setting.shift_period, Setting.shift_period + 1),
+                dtype="float32" if Setting.corr_cube_float32 else "float64",
+            )
+        cp(f"all time:{time() - t_all:.4f}s", color="red")
+        return pd.concat([df_ll for df_ll, _ in results])
+
+    def compute_windows(self, period_indexes: list[np.ndarray]) -> list[WindowResult]:
+        """Lead-lag tables of the windows, in processes if `Setting.n_jobs` > 1"""
+        if Setting.n_jobs > 1:
+            return self.parallel_lead_lag(period_indexes)
+        return [
+            lead_lag_window(sample) for sample in Samples(period_indexes=period_indexes)
+        ]
+
+    def update_lead_lag(self) -> pd.DataFrame:
+        """
+        Update the stored lead-lag table incrementally, e.g. after a quarter of new data
+        --------
+        The digests of the inputs of every window (see `window_digests`) are compared \n
+        with the ones recorded for the stored table. Only new windows and windows whose \n
+        inputs changed (e.g. restated statements, late annotations, revised inflation) \n
+        are computed, and their rows replace the old ones; windows that no longer exist \n
+        are removed. The result equals a full rebuild. \n
+        The table is rebuilt in full:
+        - without a stored table, or without digests recorded for it: `lead_lag` does \n
+        not hash the windows, the digests are recorded by the first update instead.
+        - if adjusted GDP changed (see `gdp_digest`): GDP is seasonally adjusted over \n
+        the whole series, so a new or revised GDP quarter changes every window. A new \n
+        quarter of data usually brings a GDP quarter too: data that arrives without \n
+        one (e.g. late annotations, restated statements) is updated incrementally.
+        - with `Setting.corr_cube`: the cube holds all windows at once.
+
+        Usages:
+        --------
+            >>> df_ll: pd.DataFrame = Factor().update_lead_lag()
+        """
+        if Setting.corr_cube:
+            return self.lead_lag()  # type: ignore
+        cache: Cache = self.lead_lag.cache  # type: ignore
+        df_old: pd.DataFrame | None = cache.peek(self)
+        old_digests: dict[str, Any] = self.load_window_digests()
+        if df_old is not None and cache.is_fresh(cache.path(self)):
+            cp("lead_lag is up to date", color="yellow")
+        elif df_old is None or not old_digests:
+            cp("Rebuild lead_lag in full...", color="yellow")
+            old_digests = {}
+        elif self.gdp_digest() != old_digests["gdp"]:
+            cp("Adjusted GDP changed, rebuild lead_lag in full...", color="yellow")
+            old_digests = {}
+        else:
+            return self.update_windows(df_old, old_digests)
+        df_ll: pd.DataFrame = self.lead_lag()  # type: ignore
+        if not old_digests:
+            # For the next update
+            self.record_window_digests()
+        return df_ll
+
+    def update_windows(
+        self, df_old: pd.DataFrame, old_digests: dict[str, Any]
+    ) -> pd.DataFrame:
+        """Compute the windows whose digests changed, see `update_lead_lag`"""
+        t_all: float = time()
+        with Lineage.track() as lineage:
+            gdp_digest: str = self.gdp_digest()
+            digests: dict[int, str] = self.window_digests()
+            period_indexes: list[np.ndarray] = [
+                period_index
+                for period_index in OriginalSample().period_indexes
+                if old_digests["windows"].get(int(period_index[-1]))
+                != digests[int(period_index[-1])]
+            ]
+            cp(
+                f"Update {len(period_indexes)} of {len(digests)} windows...",
+                color="yellow",
+            )
+            results: list[WindowResult] = self.compute_windows(period_indexes)
+        # Replace the rows of the windows computed again and of removed windows
+        positions: dict[int, int] = {ordinal: i for i, ordinal in enumerate(digests)}
+        is_kept: np.ndarray = np.isin(
+            period_to_ordinal(df_old["period"]),
+            [int(period_index[-1]) for period_index in period_indexes]
+            + [ordinal for ordinal in old_digests["windows"] if ordinal not in digests],
+            invert=True,
+        )
+        df_ll: pd.DataFrame = pd.concat(
+            [df_old[is_kept]] + [df_ll for df_ll, _ in results]
+        )
+        # Windows in order, as in a full rebuild
+        df_ll = df_ll.iloc[
+            np.argsort(
+                [positions[ordinal] for ordinal in period_to_ordinal(df_ll["period"])],
+                kind="stable",
+            )
+        ]
+        self.lead_lag.cache.put(  # type: ignore
+            df_ll,
+            lineage,
+            self,
+            sidecar=lambda token: self.save_window_digests(token, gdp_digest, digests),
+        )
         cp(f"all time:{time() - t_all:.4f}s", color="red")
-        return pd.concat(ll_list)
+        return self.lead_lag()  # type: ignore
+
+    def window_digests(self) -> dict[int, str]:
+        """
+        Digest of the inputs of every window: {window quarter ordinal: digest}
+        --------
+        A window depends on its rows of the cashflow panel (measures, industry, \n
+        market type, listing and annotation quarter), on the inflation of its \n
+        quarters, and on adjusted GDP, which is not windowed (see `gdp_digest`).
+        """
+        sample = OriginalSample()
+        row_hashes: np.ndarray = self.row_hashes(sample.df_cash)
+        # Inflation of each quarter
+        df_inflation: pd.DataFrame = Inflation().df_inflation
+        inflation: dict[int, float] = dict(
+            zip(
+                quarter_ordinal(df_inflation["year"], df_inflation["quarter"]).tolist(),
+                df_inflation["inflation"].to_numpy(dtype=float).tolist(),
+            )
+        )
+        quarter_digests: dict[int, str] = {
+            int(quarter): hashlib.sha256(
+                row_hashes[start:end].tobytes()
+                + np.array([inflation.get(int(quarter), np.nan)]).tobytes()
+            ).hexdigest()
+            for quarter, (start, end) in sample.offset.items()
+        }
+        return {
+            int(period_index[-1]): hashlib.sha256(
+                "".join(quarter_digests[int(q)] for q in period_index).encode()
+            ).hexdigest()[:16]
+            for period_index in sample.period_indexes
+        }
+
+    @staticmethod
+    def gdp_digest() -> str:
+        """
+        Digest of adjusted GDP
+        ------
+        GDP is seasonally adjusted over the whole series (after inflation), so a \n
+        new or revised quarter of GDP or inflation changes it in every window.
+        """
+        return Cache.hash_data(
+            Adjust(df_adjust=GDP().df_gdp, adjust_column="GDP").adjust_result
+        )
+
+    @staticmethod
+    def row_hashes(df_cash: pd.DataFrame) -> np.ndarray:
+        """
+        Hash of every row of the panel, for `window_digests`
+        ------
+        The columns are cast to fixed dtypes first, since the hashes depend on them: \n
+        e.g. `anno_quarter` turns from int into float once a row is not annotated, \n
+        which must not change the hashes of the other rows.
+        """
+        dtypes: dict[str, str] = {
+            "stock": "int64",
+            "year": "int64",
+            "quarter": "int64",
+            "industry_code": "float64",
+            "market_type": "float64",
+            "is_listed": "bool",
+            "anno_quarter": "float64",
+            **{measure: "float64" for measure in Setting.cashflow_measures},
+        }
+        return pd.util.hash_pandas_object(
+            df_cash[list(dtypes)].astype(dtypes), index=False
+        ).to_numpy()
+
+    @property
+    def window_digest_path(self) -> Path:
+        """The digests are stored beside the artifact of the lead-lag table"""
+        return self.lead_lag.cache.path(self).with_suffix(".windows.json")  # type: ignore
+
+    def record_window_digests(self) -> None:
+        """Record the digests of the inputs of the stored table, which is fresh"""
+        cache_path: Path = self.lead_lag.cache.path(self)  # type: ignore
+        gdp_digest: str = self.gdp_digest()
+        digests: dict[int, str] = self.window_digests()
+        with FileLock.of(cache_path):
+            self.save_window_digests(
+                Lineage.load_manifest(cache_path.with_suffix(".json")).get("token"),
+                gdp_digest,
+                digests,
+            )
+
+    def save_window_digests(
+        self, token: str | None, gdp_digest: str, digests: dict[int, str]
+    ) -> None:
+        """
+        Store the digests for the version `token` of the table
+        ------
+        Called under the lock of the table. The file is replaced at once, so it is \n
+        never read half written.
+        """
+        temp_path: Path = self.window_digest_path.with_suffix(f".{os.getpid()}.tmp")
+        temp_path.write_text(
+            json.dumps(
+                {"token": token, "gdp": gdp_digest, "windows": digests}, indent=4
+            )
+        )
+        os.replace(temp_path, self.window_digest_path)
+
+    def load_window_digests(self) -> dict[str, Any]:
+        """The digests of the stored table, {} if missing or of another version"""
+        cache_path: Path = self.lead_lag.cache.path(self)  # type: ignore
+        try:
+            stored: dict[str, Any] = json.loads(self.window_digest_path.read_text())
+        except (OSError, ValueError):
+            return {}
+        token: str | None = Lineage.load_manifest(cache_path.with_suffix(".json")).get(
+            "token"
+        )
+        if token is None or stored.get("token") != token:
+            return {}
+        stored["windows"] = {
+            int(ordinal): digest for ordinal, digest in stored["windows"].items()
+        }
+        return stored
+
+    @property
+    def corr_cube_directory(self) -> Path:
+        """The cube is stored beside the artifact of the lead-lag table"""
+        return self.lead_lag.cache.path(self).with_suffix(".cube")  # type: ignore
+
+    def corr_cube(self) -> CorrCube:
+        """
+        Absolute cross-correlations of all windows (period × industry × measure × lag)
+        --------
+        Requires `Setting.corr_cube`. The lead-lag table, and its cube with it, is \n
+        computed if it is missing or stale. New lead-lag statistics can be computed \n
+        from the cube without computing the windows again.
+
+        Usages:
+        --------
+            >>> Setting.corr_cube = True
+            >>> cube: CorrCube = Factor().corr_cube()
+            >>> cube["EBITDA"]  # period × industry × lag
+        """
+        if not Setting.corr_cube:
+            raise ValueError("Set `Setting.corr_cube = True` to persist the cube")
+        self.lead_lag(columns=["period"])  # type: ignore
+        return CorrCube(self.corr_cube_directory)
+
+    def parallel_lead_lag(self, period_indexes: list[np.ndarray]) -> list[WindowResult]:
+        """
+        Lead-lag tables of the windows, computed by `Setting.n_jobs` processes
+        --------
+        The windows are split into contiguous chunks, one task per chunk, and the \n
+        tables are collected in window order, so the result equals the serial one. \n
+        The base panel is built once here: forked workers inherit it, and spawned \n
+        workers build it once in `init_worker` (from the cache), so it is never \n
+        sent with a task. The cache stats of the workers are merged into these.
+        """
+        chunks: list[list[np.ndarray]] = [
+            [period_indexes[i] for i in chunk]
+            for chunk in np.array_split(np.arange(len(period_indexes)), Setting.n_jobs)
+            if len(chunk)
+        ]
+        cp(
+            f"Compute {len(period_indexes)} windows with {len(chunks)} processes...",
+            color="yellow",
+        )
+        results: list[WindowResult] = []
+        with ProcessPoolExecutor(
+            max_workers=len(chunks),
+            initializer=init_worker,
+            initargs=(Cache.setting_snapshot(),),
+        ) as executor:
+            for chunk_results, lineage, stats in executor.map(lead_lag_chunk, chunks):
+                # Data read by the workers is a part of the lineage as well
+                Lineage.replay(lineage)
+                CacheStats.merge(stats)
+                results += chunk_results
+        return results
+
+
+def init_worker(settings: dict[str, Any]) -> None:
+    """Initializer of worker processes: apply the settings of the parent process"""
+    for field, value in settings.items():
+        setattr(Setting, field, value)
+    # Forked workers inherit the stats of the parent process, which has them already
+    CacheStats.drain()
+    OriginalSample()
+
+
+def lead_lag_window(sample: LLWindow) -> WindowResult:
+    """Lead-lag table of a window, and its correlations if `Setting.corr_cube`"""
+    lead_lag: LeadLag = LeadLag(sample=sample)
+    df_ll: pd.DataFrame = lead_lag.df_ll
+    if not Setting.corr_cube:
+        return df_ll, None
+    return df_ll, (sample.period, lead_lag.corr_dict)
+
+
+def lead_lag_chunk(
+    period_indexes: list[np.ndarray],
+) -> tuple[list[WindowResult], dict[str, dict[str, Any]], dict[str, dict[str, Any]]]:
+    """Lead-lag tables of consecutive windows, what was read for them, and stats"""
+    with Lineage.track() as lineage:
+        results: list[WindowResult] = [
+            lead_lag_window(sample) for sample in Samples(period_indexes=period_indexes)
+        ]
+    return results, lineage, CacheStats.drain()
 
 
 class LLFactor(object):
     def __init__(self, cashflow=None, measure=None) -> None:
         if cashflow is not None and measure is not None:
             self.df_factor = (
-                Factor()  # type:ignore
-                .df_ll[
-                    [
+                Factor()  # type: ignore
+                .lead_lag(
+                    columns=[
                         "period",
                         "industry_code",
                         f"{measure}({cashflow})",
                     ]
-                ]
+                )
                 .dropna()
             )
         else:
@@ -240,10 +552,30 @@ class LLFactor(object):
 
 if __name__ == "__main__":
     # samples = Samples()
-    # ll = LeadLag(next(samples))
+    # ll = LeadLag(samples[0])
     # ll.factor()
     # ic(ll.sample.df_dict["EBITDA"])
     # ic(ll.corr_columns_dict)
+    # A new quarter with unannotated rows turns `anno_quarter` into float,
+    # the hashes of the rows of the earlier quarters do not change
+    df_old = pd.DataFrame(
+        {
+            "stock": [1, 2],
+            "year": 2010,
+            "quarter": 1,
+            "industry_code": 3,
+            "market_type": 1,
+            "is_listed": True,
+            "anno_quarter": np.array([8041, 8042], dtype=np.int32),
+            **{measure: [1.0, 2.0] for measure in Setting.cashflow_measures},
+        }
+    )
+    df_new = pd.concat(
+        [df_old, df_old.iloc[:1].assign(quarter=2, anno_quarter=np.nan)],
+        ignore_index=True,
+    )
+    assert df_new["anno_quarter"].dtype == "float64"
+    assert (Factor().row_hashes(df_new)[:2] == Factor().row_hashes(df_old)).all()
     df_factor1 = LLFactor(cashflow="EBITDA", measure="LL_industry").df_factor
     df_factor2 = LLFactor(cashflow="EBIT", measure="LL_industry").df_factor
     ic(df_factor1)
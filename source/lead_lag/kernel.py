@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+# @Author: 昵称有六个字
+# @Date:   2023-10-21 10:12:40
+# @Last Modified by:   昵称有六个字
+# @Last Modified time: 2023-10-21 15:36:18
+"""
+codes, corr = rolling_corr(codes, x, y, lags, window) \n
+statistics = ll_statistics(corr, lags)
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+from icecream import ic
+
+ic.configureOutput(prefix="")
+sys.path.append(str(Path.cwd()))
+
+
+def to_panel(
+    codes: np.ndarray, values: np.ndarray
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Pad grouped values into a (group × time) array
+    ------
+    Groups are sorted by code and keep the order of their rows (like `groupby`).
+
+    Returns:
+    --------
+        tuple: The padded array (NaN after the end of a group), the group codes \n
+        and the group lengths.
+    """
+    group_codes, inverse, lengths = np.unique(
+        codes, return_inverse=True, return_counts=True
+    )
+    order: np.ndarray = np.argsort(inverse, kind="stable")
+    starts: np.ndarray = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    time: np.ndarray = np.empty(len(codes), dtype=np.int64)
+    time[order] = np.arange(len(codes)) - np.repeat(starts, lengths)
+    panel: np.ndarray = np.full((len(group_codes), lengths.max(initial=0)), np.nan)
+    panel[inverse, time] = values
+    return panel, group_codes, lengths
+
+
+def standardize(panel: np.ndarray) -> np.ndarray:
+    """
+    Center and scale each group (row) of a panel
+    ------
+    Correlations do not change, but the cumulative sums stay small, \n
+    so that window sums taken as differences of them keep their precision.
+    """
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean: np.ndarray = np.nanmean(panel, axis=1, keepdims=True)
+        scale: np.ndarray = np.nanstd(panel, axis=1, keepdims=True)
+    scale[~(scale > 0)] = 1
+    return (panel - np.nan_to_num(mean)) / scale
+
+
+def window_sum(panel: np.ndarray, window: int) -> np.ndarray:
+    """Sums over the rolling windows of the time axis (axis 1), from cumulative sums"""
+    cumsum: np.ndarray = np.cumsum(panel, axis=1)
+    zeros: np.ndarray = np.zeros_like(cumsum[:, :1])
+    cumsum = np.concatenate([zeros, cumsum], axis=1)
+    return cumsum[:, window:] - cumsum[:, :-window]
+
+
+def rolling_corr(
+    codes: np.ndarray,
+    x: np.ndarray,
+    y: np.ndarray,
+    lags: np.ndarray,
+    window: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Rolling Pearson correlation between lagged `x` and `y` within groups, all lags at once.
+    --------
+    Equals `df.groupby(codes)[x.shift(lag) for lag in lags].rolling(window).corr(y)` \n
+    followed by `dropna()`: a window counts if both series are observed on all \n
+    of its rows. `x.shift(lag)` is `x[t - lag]` within the group, by position. \n
+    The window sums of x, y, x², y², xy are differences of cumulative sums over \n
+    a (group × time × lag) array.
+
+    Args:
+    --------
+        codes (np.ndarray): Group of each row, e.g. industry codes.
+        x (np.ndarray): The series to shift, e.g. a cashflow measure.
+        y (np.ndarray): The other series, e.g. GDP.
+        lags (np.ndarray): Shift periods.
+        window (int): Rolling window.
+
+    Returns:
+    --------
+        tuple[np.ndarray, np.ndarray]: Group code of each window (in group order, \n
+        then time order), and the correlations of the windows (window × lag).
+
+    Usages:
+    --------
+        >>> codes, corr = rolling_corr(codes, x, y, lags=np.arange(-2, 3), window=20)
+    """
+    lags = np.asarray(lags, dtype=np.int64)
+    x_panel, group_codes, lengths = to_panel(codes, x)
+    y_panel: np.ndarray = to_panel(codes, y)[0]
+    n_times: int = x_panel.shape[1]
+    if n_times < window:
+        return group_codes[:0], np.empty((0, len(lags)))
+    # (group × time × lag): x_lagged[g, t, k] = x[g, t - lags[k]]
+    pad: int = int(np.abs(lags).max(initial=0))
+    x_padded: np.ndarray = np.pad(
+        standardize(x_panel), ((0, 0), (pad, pad)), constant_values=np.nan
+    )
+    x_lagged: np.ndarray = np.stack(
+        [x_padded[:, pad - lag : pad - lag + n_times] for lag in lags], axis=2
+    )
+    y_lagged: np.ndarray = np.broadcast_to(
+        standardize(y_panel)[:, :, None], x_lagged.shape
+    )
+    valid: np.ndarray = ~np.isnan(x_lagged) & ~np.isnan(y_lagged)
+    x_lagged = np.where(valid, x_lagged, 0)
+    y_lagged = np.where(valid, y_lagged, 0)
+    # Sums over the windows ending at time window-1, ..., n_times-1
+    count: np.ndarray = window_sum(valid.astype(np.int64), window)
+    sum_x: np.ndarray = window_sum(x_lagged, window)
+    sum_y: np.ndarray = window_sum(y_lagged, window)
+    sum_xx: np.ndarray = window_sum(x_lagged * x_lagged, window)
+    sum_yy: np.ndarray = window_sum(y_lagged * y_lagged, window)
+    sum_xy: np.ndarray = window_sum(x_lagged * y_lagged, window)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov: np.ndarray = sum_xy - sum_x * sum_y / window
+        var_x: np.ndarray = sum_xx - sum_x * sum_x / window
+        var_y: np.ndarray = sum_yy - sum_y * sum_y / window
+        corr: np.ndarray = cov / np.sqrt(var_x * var_y)
+    corr[(count < window) | ~(var_x > 0) | ~(var_y > 0)] = np.nan
+    # Windows inside their group and observed at every lag
+    end: np.ndarray = np.arange(window - 1, n_times)
+    keep: np.ndarray = (end[None, :] < lengths[:, None]) & ~np.isnan(corr).any(axis=2)
+    return np.repeat(group_codes, keep.sum(axis=1)), corr[keep]
+
+
+def ll_statistics(corr: np.ndarray, lags: np.ndarray) -> dict[str, np.ndarray]:
+    """
+    Lead-lag statistics of absolute cross-correlations, batched over leading axes.
+    --------
+    `corr` is (... × industry × lag): the industries of a window on axis -2 and \n
+    the lags on axis -1, e.g. (measure × industry × lag) for all measures of a \n
+    window, or `np.moveaxis(cube.corr, 1, 2)` for a whole `CorrCube`. \n
+    Rows without correlations (NaN) are allowed, e.g. as padding.
+
+    1. LL_max: the lag of the maximum correlation (the first one if tied).
+    2. LL_average: Σ corr·lag / Σ corr over the lags of an industry.
+    3. LL_industry: Σ corr·lag / Σ corr, each lag weighted by its sum over the \n
+    industries of the window.
+
+    Args:
+    --------
+        corr (np.ndarray): Absolute cross-correlations (... × industry × lag).
+        lags (np.ndarray): Shift period of each lag.
+
+    Returns:
+    --------
+        dict[str, np.ndarray]: {"LL_max": ..., "LL_average": ..., "LL_industry": ...}, \n
+        each (... × industry), NaN for rows without correlations.
+
+    Usages:
+    --------
+        >>> statistics = ll_statistics(corr, lags=np.arange(-2, 3))
+        >>> statistics["LL_max"]
+    """
+    lags = np.asarray(lags, dtype=float)
+    is_nan: np.ndarray = np.isnan(corr)
+    ll_max: np.ndarray = lags[np.where(is_nan, -np.inf, corr).argmax(axis=-1)]
+    ll_max[is_nan.all(axis=-1)] = np.nan
+    weighted: np.ndarray = (corr * lags).sum(axis=-1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ll_average: np.ndarray = weighted / np.nansum(corr, axis=-1)
+        ll_industry: np.ndarray = (
+            corr * lags / np.nansum(corr, axis=-2, keepdims=True)
+        ).sum(axis=-1)
+    return {"LL_max": ll_max, "LL_average": ll_average, "LL_industry": ll_industry}
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame(
+        {
+            "industry_code": np.repeat([1, 2, 3], [30, 24, 10]),
+            "x": rng.normal(size=64),
+            "y": rng.normal(size=64),
+        }
+    )
+    lags = np.arange(-2, 3)
+    for lag in lags:
+        df[f"x({lag})"] = df.groupby("industry_code")["x"].shift(lag)
+    expected = (
+        df.drop(columns=["x", "y"])
+        .groupby("industry_code")
+        .rolling(window=20)
+        .corr(df["y"])
+        .dropna()
+    )
+    codes, corr = rolling_corr(
+        df["industry_code"].to_numpy(), df["x"].to_numpy(), df["y"].to_numpy(), lags, 20
+    )
+    ic(np.allclose(expected.to_numpy(), corr), codes)
+    ic(ll_statistics(np.abs(corr), lags))
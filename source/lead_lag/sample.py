@@ -7,15 +7,16 @@
 OriginalSample().get_samples() \n
 Delete(window=next(samples)).cashflow_window \n
 samples = Samples() \n
-sample = next(samples) \n
+sample = samples[0] \n
 sample.df_dict \n
 sample.period \n
 sample.cashflow_columns
 """
 
+import copy
 import sys
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 
 import numpy as np
 import pandas as pd
@@ -27,39 +28,108 @@ from source.data.basic import (
     AnnotationDate,
     ListedDelistedDate,
     MarketType,
-    get_industry_classification,
+    merge_industry,
 )
 from source.data.cashflow import get_cashflow
 from source.data.macro import GDP
-from source.modules.cache import cp
+from source.data.origin import Origin
+from source.modules.cache import Cache, cp
 from source.modules.setting import Setting
-from source.modules.tools import singleton
-from source.modules.structure import LLWindow, CashflowWindow, Window
+from source.modules.tools import (
+    lazy_attribute,
+    ordinal_to_period,
+    period_to_ordinal,
+    quarter_ordinal,
+    singleton,
+)
+from source.modules.structure import (
+    CashflowWindow,
+    LLWindow,
+    Window,
+)
+
+
+@Cache(
+    file_path=f"{Setting.cache_path}/original_sample.parquet",
+    test=False,
+    settings=["basic_path", "cashflow_path", "sample_start_year"],
+)
+def get_original_sample():
+    """
+    The cashflow panel of all windows
+    ------
+    Cashflow, industry and the eligibility of every row (see `Delete.eligibility`), \n
+    sorted by quarter, so that the rows of a window are one contiguous slice.
+    """
+    Origin.prefetch("market_type", "listed_delisted", "annotation_date")
+    # Merge cashflow data and industry classification data
+    df_cash: pd.DataFrame = merge_industry(get_cashflow())  # type: ignore
+    # Generate quarter ordinal column
+    df_cash["quarter_ordinal"] = quarter_ordinal(df_cash["year"], df_cash["quarter"])
+    # Precompute the eligibility of every row once for all windows
+    df_cash = Delete.eligibility(df_cash)
+    return df_cash.sort_values(by="quarter_ordinal", kind="stable").reset_index(
+        drop=True
+    )
 
 
 @singleton
 class OriginalSample(object):
     """
     Generator for (20+4*2+1)-quarters-window of a sample period
+    ------
+    The panel itself is read through the memory tier of `Cache` on every access \n
+    (see `df_cash`), so it counts against `Setting.cache_memory_budget`: only the \n
+    quarters and their row offsets are kept by the instance.
     """
 
     def __init__(self) -> None:
-        # Merge cashflow data and industry classification data
-        self.df_cash = pd.merge(
-            get_cashflow(),  # type: ignore
-            get_industry_classification(),  # type: ignore
-            on=["stock", "year", "quarter"],
-            how="inner",
-        )
-        # Generate year_quarter column
-        self.df_cash["year_quarter"] = self.df_cash[["year", "quarter"]].apply(
-            lambda row: pd.Period(year=row["year"], quarter=row["quarter"], freq="Q"),
-            axis=1,
-        )
-        # Generate period range
-        self.period_range: np.ndarray[pd.Period, Any] = self.df_cash[
-            "year_quarter"
-        ].unique()
+        # Parse the files of `LLWindow` while the panel is prepared
+        Origin.prefetch("gdp", "inflation")
+        quarters, starts = np.unique(
+            self.df_cash["quarter_ordinal"].to_numpy(), return_index=True
+        )
+        ends: np.ndarray = np.append(starts[1:], len(self.df_cash))
+        # Generate period range (quarter ordinals)
+        self.period_range: np.ndarray = quarters
+        # Quarter ordinal → (start, end) row offsets
+        self.offset: dict[int, tuple[int, int]] = {
+            quarter: (start, end) for quarter, start, end in zip(quarters, starts, ends)
+        }
+
+    @property
+    def df_cash(self) -> pd.DataFrame:
+        """The panel (see `get_original_sample`), evicted → read from disk again"""
+        return get_original_sample()  # type: ignore
+
+    def slice(self, period_index: np.ndarray) -> pd.DataFrame:
+        """Rows of the quarters, a positional slice (not a copy) if they are consecutive"""
+        bounds: np.ndarray = np.array(sorted(self.offset[q] for q in period_index))
+        df_cash: pd.DataFrame = self.df_cash
+        if (bounds[1:, 0] == bounds[:-1, 1]).all():
+            return df_cash.iloc[bounds[0, 0] : bounds[-1, 1]]
+        return df_cash.iloc[
+            np.concatenate([np.arange(start, end) for start, end in bounds])
+        ]
+
+    @property
+    def period_indexes(self) -> list[np.ndarray]:
+        """Quarter ordinals of every window"""
+        return list(
+            filter(
+                lambda x: len(x) >= Setting.sample_periods,
+                [
+                    self.period_range[i : i + Setting.sample_periods]
+                    for i in range(len(self.period_range))
+                ],
+            )
+        )
+
+    def get_window(self, period_index: np.ndarray) -> Window:
+        return Window(
+            period=ordinal_to_period(period_index[-1]),
+            df=self.slice(period_index),
+        )
 
     def get_samples(self):
         """
@@ -72,19 +142,8 @@ class OriginalSample(object):
             >>> {"quarter" : Period('2010Q1', 'Q-DEC'), "df_cash" : pd.DataFrame},
             >>> ...
         """
-        for period_index in filter(
-            lambda x: len(x) >= Setting.sample_periods,
-            [
-                self.period_range[i : i + Setting.sample_periods]
-                for i in range(len(self.period_range))
-            ],
-        ):
-            yield Window(
-                period=period_index[-1],
-                df=self.df_cash[self.df_cash["year_quarter"].isin(period_index)].drop(
-                    columns="year_quarter"
-                ),
-            )
+        for period_index in self.period_indexes:
+            yield self.get_window(period_index)
 
 
 class Delete(object):
@@ -103,19 +162,70 @@ class Delete(object):
     ```
     """
 
-    df_market_type: pd.DataFrame = MarketType().df_market_type
-    df_listed: pd.DataFrame = ListedDelistedDate().df_listed
-    df_anno: pd.DataFrame = AnnotationDate().df_anno
+    @lazy_attribute
+    def df_market_type(cls) -> pd.DataFrame:
+        return MarketType().df_market_type
+
+    @lazy_attribute
+    def df_listed(cls) -> pd.DataFrame:
+        return ListedDelistedDate().df_listed
+
+    @lazy_attribute
+    def df_anno(cls) -> pd.DataFrame:
+        return AnnotationDate().df_anno
 
     def __init__(self, window: Window) -> None:
         self.window: Window = window
+        # Rows to keep, narrowed by each rule (the window itself is not copied)
+        self.keep: pd.Series = pd.Series(True, index=self.window.df.index)
         self.delete_market()
         self.delete_delay()
         self.delete_unlisted()
         self.delete_nan()
         self.delete_unbalanced_stock()
+        self.generate_cashflow_window()
         # ic(self.cashflow_window)
 
+    @classmethod
+    def eligibility(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Eligibility of every row, precomputed once for all windows
+        --------
+        - market_type: The market type of the stock (`Setting.market_list` is \n
+        applied to it in each window, so that the panel does not depend on it).
+        - is_listed: The quarter is after the listed quarter.
+        - anno_quarter: Quarter ordinal of the annotation date (NaN if unknown). \n
+        The row is admissible in windows ending at `anno_quarter - delay_max_period` \n
+        or later.
+
+        Args:
+        --------
+            df (pd.DataFrame): The panel with a `quarter_ordinal` column.
+        """
+        # Market type
+        df["market_type"] = df["stock"].map(
+            cls.df_market_type.drop_duplicates(subset="stock").set_index("stock")[
+                "market_type"
+            ]
+        )
+        # Listed quarter
+        df["is_listed"] = df["quarter_ordinal"] > df["stock"].map(
+            cls.df_listed.drop_duplicates(subset="stock").set_index("stock")[
+                "listed_quarter"
+            ]
+        )
+        # Annotation quarter
+        df_anno: pd.DataFrame = cls.df_anno.drop_duplicates(
+            subset=["stock", "year", "quarter"]
+        )
+        df_anno = df_anno.assign(
+            anno_quarter=quarter_ordinal(
+                df_anno["annotation_date"].dt.year,
+                df_anno["annotation_date"].dt.quarter,
+            )
+        )[["stock", "year", "quarter", "anno_quarter"]]
+        return pd.merge(df, df_anno, on=["stock", "year", "quarter"], how="left")
+
     def delete_market(self) -> None:
         """
         Delete market type not in [1, 4] \n
@@ -125,14 +235,7 @@ class Delete(object):
             f"Delete market type not in {Setting.market_list}...",
             color="magenta",
         )
-        # Merge market_type data
-        self.window.df = pd.merge(
-            self.window.df, self.df_market_type, on="stock", how="left"
-        )
-        # Delete market_type not in [1, 4]
-        self.window.df = self.window.df[
-            self.window.df["market_type"].isin(Setting.market_list)
-        ].drop(columns="market_type")
+        self.keep &= self.window.df["market_type"].isin(Setting.market_list)
 
     def delete_delay(self) -> None:
         """Delete stocks that have delayed release of financial data"""
@@ -140,17 +243,11 @@ class Delete(object):
             "Delete stocks that have delayed release of financial data...",
             color="magenta",
         )
-        # Merge annotation date data
-        self.window.df = pd.merge(
-            self.window.df, self.df_anno, on=["stock", "year", "quarter"], how="left"
+        # Annotated after the end of the `delay_max_period`-th quarter since the window
+        self.keep &= ~(
+            self.window.df["anno_quarter"]
+            > period_to_ordinal(self.window.period) + Setting.delay_max_period
         )
-        # Delete delay data
-        self.window.df = self.window.df[
-            ~(
-                self.window.df["annotation_date"]
-                > (self.window.period + Setting.delay_max_period).end_time
-            )
-        ].drop(columns="annotation_date")
 
     def delete_unlisted(self) -> None:
         """
@@ -162,43 +259,35 @@ class Delete(object):
             "Delete unlisted stocks' data...",
             color="magenta",
         )
-        # Merge cashflow data and unlisted date data
-        self.window.df = pd.merge(
-            self.window.df,
-            self.df_listed.drop(columns=["listed_date", "delisted_date"]),
-            on="stock",
-            how="left",
-        )
-        # Delete unlisted stocks' data
-        self.window.df = self.window.df[
-            self.window.df.apply(
-                lambda row: pd.Period(
-                    year=row["year"], quarter=row["quarter"], freq="Q"
-                ),
-                axis=1,
-            )
-            > self.window.df["listed_year_quarter"]
-        ]
+        self.keep &= self.window.df["is_listed"]
 
     def delete_nan(self) -> None:
         """
         Delete stocks that contain nan cashflow data and non industry classification data
+        --------
+        The stocks to keep are found for all measures at once: `self.coverage` holds \n
+        one keep mask per measure (column) for the rows of the window. Rows deleted \n
+        by the previous rules are not considered.
         """
         cp(
             "Delete stocks that contain nan cashflow data and non industry classification data...",
             color="magenta",
         )
-        self.cashflow_window = CashflowWindow(self.window, Setting.cashflow_measures)
-        del self.window
-        for cashflow_column in self.cashflow_window.cashflow_columns:
-            self.cashflow_window.window[cashflow_column] = (
-                self.cashflow_window.window[cashflow_column]
-                .groupby("stock")
-                .filter(
-                    lambda df: df[cashflow_column].notnull().all()
-                    & df["industry_code"].notnull().all()
-                )
+        df: pd.DataFrame = self.window.df
+        keep: np.ndarray = self.keep.to_numpy()[:, None]
+        is_valid: np.ndarray = (
+            df[Setting.cashflow_measures].notnull().to_numpy()
+            & df["industry_code"].notnull().to_numpy()[:, None]
+        )
+        # A stock is kept if all of its kept rows are valid
+        self.coverage: pd.DataFrame = (
+            pd.DataFrame(
+                is_valid | ~keep, index=df.index, columns=Setting.cashflow_measures
             )
+            .groupby(df["stock"])
+            .transform("all")
+            & keep
+        )
 
     def delete_unbalanced_stock(self):
         """Delete stocks that are not balanced during the window period"""
@@ -207,46 +296,121 @@ class Delete(object):
                 "Delete stocks that are not balanced during the window period",
                 color="magenta",
             )
-            for cashflow_column in self.cashflow_window.cashflow_columns:
-                self.cashflow_window.window[cashflow_column] = (
-                    self.cashflow_window.window[cashflow_column]
-                    .groupby("stock")
-                    .filter(lambda df: len(df) < Setting.sample_periods)
-                )
+            self.coverage &= (
+                self.keep.groupby(self.window.df["stock"]).transform("sum")
+                < Setting.sample_periods
+            ).to_numpy()[:, None]
+
+    def generate_cashflow_window(self) -> None:
+        """Keep the covered rows of each measure (as masks over the shared window)"""
+        self.cashflow_window = CashflowWindow(
+            self.window, Setting.cashflow_measures, masks=self.coverage
+        )
+        del self.window
 
 
-@singleton
 class Samples(object):
     """
+    Windows of the sample, as a sequence
+    ------
+    Windows are built on access. With `memoize`, built windows are kept and a copy \n
+    is returned, so that `LeadLag` (which modifies its window) can reuse them.
+
+    Args:
+    ------
+        period_indexes (list[np.ndarray] | None): Quarter ordinals of the windows, \n
+        None → all windows of `OriginalSample`.
+        memoize (bool): Keep built windows. Defaults to False.
+
+    Usages:
+    ------
     ```python
-    # Method 1
     samples = Samples()
-    ic(next(samples))
-    ic(next(samples))
-    # Method 2
-    for sample in Samples():
+    len(samples)
+    ic(samples[0])  # By position
+    ic(samples["2010Q1"])  # By the period of the window (str or pd.Period)
+    for sample in samples["2010Q1":"2012Q4"]:  # Periods in a range (included)
+        ic(sample)
+    for sample in samples:  # Iterate as many times as needed
         ic(sample)
     ```
     """
 
-    def __init__(self) -> None:
-        self.windows = OriginalSample().get_samples()
+    def __init__(
+        self, period_indexes: list[np.ndarray] | None = None, memoize: bool = False
+    ) -> None:
+        self.period_indexes: list[np.ndarray] = (
+            OriginalSample().period_indexes
+            if period_indexes is None
+            else period_indexes
+        )
+        self.memoize: bool = memoize
+        self.memo: dict[int, LLWindow] = {}
+        # Window period (quarter ordinal) → position
+        self.positions: dict[int, int] = {
+            period_index[-1]: position
+            for position, period_index in enumerate(self.period_indexes)
+        }
+
+    def __len__(self) -> int:
+        return len(self.period_indexes)
 
-    def __iter__(self):
-        return self
+    def __iter__(self) -> Iterator[LLWindow]:
+        for position in range(len(self)):
+            yield self[position]
+
+    def __getitem__(self, key: int | str | pd.Period | slice) -> Any:
+        if isinstance(key, slice):
+            return Samples(
+                period_indexes=[self.period_indexes[i] for i in self.to_positions(key)],
+                memoize=self.memoize,
+            )
+        position: int = self.to_position(key)
+        if position in self.memo:
+            return copy.deepcopy(self.memo[position])
+        ll_window: LLWindow = self.ll_window(self.period_indexes[position])
+        if self.memoize:
+            self.memo[position] = copy.deepcopy(ll_window)
+        return ll_window
+
+    def to_position(self, key: int | str | pd.Period) -> int:
+        """Position of a window by position or by period"""
+        if isinstance(key, (int, np.integer)):
+            return range(len(self))[key]
+        ordinal: int = period_to_ordinal(pd.Period(key, freq="Q"))
+        if ordinal not in self.positions:
+            raise KeyError(f"No window of {key}")
+        return self.positions[ordinal]
+
+    def to_positions(self, key: slice) -> range | list[int]:
+        """Positions of a slice by positions or by periods (both ends included)"""
+        if all(
+            isinstance(x, (int, np.integer)) or x is None for x in (key.start, key.stop)
+        ):
+            return range(len(self))[key]
+        ordinals: np.ndarray = np.array([x[-1] for x in self.period_indexes])
+        is_in: np.ndarray = np.ones(len(self), dtype=bool)
+        if key.start is not None:
+            is_in &= ordinals >= period_to_ordinal(pd.Period(key.start, freq="Q"))
+        if key.stop is not None:
+            is_in &= ordinals <= period_to_ordinal(pd.Period(key.stop, freq="Q"))
+        return list(np.flatnonzero(is_in)[:: key.step])
 
-    def __next__(self):
+    def ll_window(self, period_index: np.ndarray) -> LLWindow:
         return LLWindow(
-            cashflow_window=Delete(window=next(self.windows)).cashflow_window,
+            cashflow_window=Delete(
+                window=OriginalSample().get_window(period_index)
+            ).cashflow_window,
             df_gdp=GDP().df_gdp,
         )
 
 
 if __name__ == "__main__":
     samples = Samples()
-    sample = next(samples)
+    ic(len(samples))
+    sample = samples[0]
     ic(sample)
-    sample = next(samples)
+    sample = samples[1]
     ic(sample.df_dict)
     # for sample in Samples():
     #     ic(sample)
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+# @Author: 昵称有六个字
+# @Date:   2023-10-22 09:35:17
+# @Last Modified by:   昵称有六个字
+# @Last Modified time: 2023-10-22 17:08:44
+"""
+sweep = Sweep({"window_period": [16, 20], "price_index": ["CPI", "PPI"]}) \n
+sweep.plan \n
+sweep.result()
+"""
+
+import hashlib
+import itertools
+import json
+import sys
+from pathlib import Path
+from time import time
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+from icecream import ic
+
+ic.configureOutput(prefix="")
+sys.path.append(str(Path.cwd()))
+
+from source.data.macro import GDP
+from source.lead_lag.adjust import Adjust
+from source.lead_lag.factor import LeadLag
+from source.lead_lag.sample import Delete, OriginalSample
+from source.modules.cache import Cache, cp
+from source.modules.setting import Setting, override
+from source.modules.structure import CashflowWindow, LLWindow, Window
+
+# A point of the grid: {field: value}
+Point = dict[str, Any]
+
+
+def group(
+    points: list[tuple[int, Point]], key: Callable[[Point], Any]
+) -> list[tuple[Any, list[tuple[int, Point]]]]:
+    """Group numbered points by the fields a stage depends on (in order of appearance)"""
+    groups: dict[str, tuple[Any, list[tuple[int, Point]]]] = {}
+    for i, point in points:
+        fields: Any = key(point)
+        groups.setdefault(json.dumps(fields, sort_keys=True), (fields, []))[1].append(
+            (i, point)
+        )
+    return list(groups.values())
+
+
+class Sweep(object):
+    """
+    Parameter sweep of the lead-lag table.
+    --------
+    Every point of the grid is computed under `override`. A stage is computed \n
+    once for all the points of a window that read the same data and the same \n
+    fields (a memo per window), and reused by the others:
+
+    1. The cashflow panel (`OriginalSample`): once for all points.
+    2. The rows of each window: once per `sample_periods` (e.g. window_period=20, \n
+    shift_period=2 and window_period=18, shift_period=3 share their windows).
+    3. Eligibility (`Delete`): once per `market_list`, `delay_max_period` and \n
+    `is_balance_panel`. The other stages are keyed by the rows it keeps \n
+    (see `coverage_digest`), not by these fields: e.g. delay_max_period=1 and 2 \n
+    share everything below in the windows where no row is annotated that late.
+    4. Industry sums (`LLWindow.industry_sum`): once per kept rows.
+    5. Inflation and seasonal adjustment of the sums: once per kept rows and \n
+    `price_index`.
+    6. Adjusted GDP: once per `price_index` and `gdp_column` for the sweep, \n
+    merged with the adjusted sums once per kept rows, `price_index` and `gdp_column`.
+    7. Cross-correlations and lead-lag statistics (`LeadLag`): once per kept rows, \n
+    `price_index`, `gdp_column`, `window_period` and `shift_period`.
+
+    Points with different `sample_periods` read different windows, so they share \n
+    the panel and adjusted GDP only. `reuse` counts, for the last computation, \n
+    how many times each stage was computed and reused.
+
+    The result is a tidy table: the fields of the point, then the columns of \n
+    `Factor().lead_lag()`. It is cached for the grid (see `Cache`).
+
+    Args:
+    --------
+        grid (dict[str, list]): Values of each field, e.g. {"window_period": [16, 20]}. \n
+        Fields not in the grid take their value from `Setting`.
+
+    Usages:
+    --------
+        >>> sweep = Sweep({"window_period": [16, 20], "price_index": ["CPI", "PPI"]})
+        >>> sweep.plan
+        >>> df_sweep: pd.DataFrame = sweep.result()
+        >>> sweep.reuse
+    """
+
+    fields: list[str] = [
+        "window_period",
+        "shift_period",
+        "delay_max_period",
+        "price_index",
+        "gdp_column",
+        "market_list",
+        "is_balance_panel",
+    ]
+    stages: list[str] = [
+        "windows",
+        "eligibility",
+        "industry_sum",
+        "adjust",
+        "gdp",
+        "merge_gdp",
+        "lead_lag",
+    ]
+
+    def __init__(self, grid: dict[str, list]) -> None:
+        unknown: list[str] = [field for field in grid if field not in self.fields]
+        if unknown:
+            raise ValueError(f"Cannot sweep {unknown}, choose from {self.fields}")
+        self.grid: dict[str, list] = grid
+        # Stage → computed/reused counts of the last computation (see `result`)
+        self.reuse: pd.DataFrame = pd.DataFrame(columns=["computed", "reused"])
+
+    @property
+    def points(self) -> list[Point]:
+        """Every combination of the grid, completed with `Setting`"""
+        values: list[list] = [
+            self.grid.get(field, [getattr(Setting, field)]) for field in self.fields
+        ]
+        return [dict(zip(self.fields, point)) for point in itertools.product(*values)]
+
+    @staticmethod
+    def window_key(point: Point) -> dict[str, Any]:
+        """Fields that the rows of the windows depend on"""
+        with override(**point):
+            return {"sample_periods": Setting.sample_periods}
+
+    @staticmethod
+    def eligibility_key(point: Point) -> dict[str, Any]:
+        """Fields that the eligibility of the rows depends on"""
+        return {
+            "market_list": point["market_list"],
+            "delay_max_period": point["delay_max_period"],
+            "is_balance_panel": point["is_balance_panel"],
+        }
+
+    @staticmethod
+    def coverage_digest(cashflow_window: CashflowWindow) -> str:
+        """Digest of the rows kept for each measure in a window"""
+        masks: np.ndarray = cashflow_window.masks.to_numpy(dtype=bool)
+        return hashlib.sha256(
+            json.dumps(cashflow_window.cashflow_columns).encode()
+            + np.packbits(masks).tobytes()
+        ).hexdigest()
+
+    @property
+    def plan(self) -> pd.DataFrame:
+        """
+        Points and the groups of the stages keyed by fields
+        --------
+        What the stages keyed by kept rows share is only known while computing \n
+        (see `reuse`).
+        """
+        points: list[Point] = self.points
+        df_plan: pd.DataFrame = pd.DataFrame(points)
+        df_plan["windows"] = pd.factorize(
+            [json.dumps(self.window_key(point)) for point in points]
+        )[0]
+        df_plan["eligibility"] = pd.factorize(
+            [
+                json.dumps([self.window_key(point), self.eligibility_key(point)])
+                for point in points
+            ]
+        )[0]
+        df_plan["gdp"] = df_plan.groupby(["price_index", "gdp_column"]).ngroup()
+        return df_plan
+
+    @Cache(
+        file_path=f"{Setting.cache_path}/sweep.parquet",
+        test=False,
+        settings=[
+            "basic_path",
+            "cashflow_path",
+            "macro_path",
+            "sample_start_year",
+            "window_period",
+            "shift_period",
+            "sample_periods",
+            "market_list",
+            "delay_max_period",
+            "is_balance_panel",
+            "price_index",
+            "gdp_column",
+            "cashflow_measures",
+        ],
+    )
+    def result(self) -> pd.DataFrame:
+        t_all: float = time()
+        points: list[Point] = self.points
+        cp(f"Sweep {len(points)} points...", color="yellow")
+        # Stage 1: the cashflow panel is shared by all points
+        OriginalSample()
+        ll_dict: dict[int, list[pd.DataFrame]] = {i: [] for i in range(len(points))}
+        gdp_dict: dict[tuple[str, str], pd.DataFrame] = {}
+        counts: dict[str, dict[str, int]] = {
+            stage: {"computed": 0, "reused": 0} for stage in self.stages
+        }
+        for _, window_points in group(list(enumerate(points)), self.window_key):
+            self.sweep_windows(window_points, ll_dict, gdp_dict, counts)
+        df_sweep: pd.DataFrame = pd.concat(
+            [
+                pd.concat(ll_dict[i]).assign(
+                    **{
+                        field: str(value) if isinstance(value, list) else value
+                        for field, value in point.items()
+                    }
+                )
+                for i, point in enumerate(points)
+                if ll_dict[i]
+            ],
+            ignore_index=True,
+        )
+        self.reuse = pd.DataFrame.from_dict(counts, orient="index")
+        cp(f"Stages computed and reused:\n{self.reuse}", color="yellow")
+        cp(f"sweep time:{time() - t_all:.4f}s", color="red")
+        return df_sweep[
+            self.fields + [c for c in df_sweep.columns if c not in self.fields]
+        ]
+
+    @staticmethod
+    def memoize(
+        memo: dict[Any, Any],
+        key: Any,
+        compute: Callable[[], Any],
+        count: dict[str, int],
+    ) -> Any:
+        """Compute a stage once per key, and count whether it was computed or reused"""
+        if key in memo:
+            count["reused"] += 1
+        else:
+            memo[key] = compute()
+            count["computed"] += 1
+        return memo[key]
+
+    def sweep_windows(
+        self,
+        window_points: list[tuple[int, Point]],
+        ll_dict: dict[int, list[pd.DataFrame]],
+        gdp_dict: dict[tuple[str, str], pd.DataFrame],
+        counts: dict[str, dict[str, int]],
+    ) -> None:
+        """Lead-lag tables of the points that share their windows"""
+        with override(**window_points[0][1]):
+            cp(
+                f"Windows of {self.window_key(window_points[0][1])} "
+                f"for {len(window_points)} points...",
+                color="yellow",
+            )
+            period_indexes: list[np.ndarray] = OriginalSample().period_indexes
+        for period_index in period_indexes:
+            # Stage 2: the rows of the window
+            window: Window = OriginalSample().get_window(period_index)
+            counts["windows"]["computed"] += 1
+            counts["windows"]["reused"] += len(window_points) - 1
+            # Memos of the window, keyed by the kept rows and the fields read
+            memo: dict[str, dict[Any, Any]] = {
+                stage: {} for stage in self.stages if stage not in ["windows", "gdp"]
+            }
+            for i, point in window_points:
+                with override(**point):
+                    # Stage 3: eligibility of the rows
+                    cashflow_window: CashflowWindow = self.memoize(
+                        memo["eligibility"],
+                        json.dumps(self.eligibility_key(point), sort_keys=True),
+                        lambda: Delete(window=window).cashflow_window,
+                        counts["eligibility"],
+                    )
+                    digest: str = self.coverage_digest(cashflow_window)
+                    # Stage 4: industry sums
+                    df_sum_dict: dict[str, pd.DataFrame] = self.memoize(
+                        memo["industry_sum"],
+                        digest,
+                        lambda: LLWindow.industry_sum(cashflow_window),
+                        counts["industry_sum"],
+                    )
+                    # Stage 5: inflation and seasonal adjustment
+                    df_adjust_dict: dict[str, pd.DataFrame] = self.memoize(
+                        memo["adjust"],
+                        (digest, Setting.price_index),
+                        lambda: {
+                            cashflow_column: Adjust(
+                                df_adjust=df_sum, adjust_column=cashflow_column
+                            ).adjust_result
+                            for cashflow_column, df_sum in df_sum_dict.items()
+                        },
+                        counts["adjust"],
+                    )
+                    # Stage 6: adjusted GDP, merged with the adjusted sums
+                    df_gdp: pd.DataFrame = self.memoize(
+                        gdp_dict,
+                        (Setting.price_index, Setting.gdp_column),
+                        lambda: Adjust(
+                            df_adjust=GDP().df_gdp, adjust_column="GDP"
+                        ).adjust_result,
+                        counts["gdp"],
+                    )
+                    df_dict: dict[str, pd.DataFrame] = self.memoize(
+                        memo["merge_gdp"],
+                        (digest, Setting.price_index, Setting.gdp_column),
+                        lambda: LLWindow.merge_gdp(df_adjust_dict, df_gdp),
+                        counts["merge_gdp"],
+                    )
+                    # Stage 7: lead-lag statistics
+                    ll_dict[i].append(
+                        self.memoize(
+                            memo["lead_lag"],
+                            (
+                                digest,
+                                Setting.price_index,
+                                Setting.gdp_column,
+                                Setting.window_period,
+                                Setting.shift_period,
+                            ),
+                            lambda: LeadLag(
+                                sample=LLWindow.from_df_dict(
+                                    cashflow_window.period, df_dict
+                                )
+                            ).df_ll,
+                            counts["lead_lag"],
+                        )
+                    )
+
+
+if __name__ == "__main__":
+    sweep = Sweep({"window_period": [18, 20], "price_index": ["CPI", "PPI"]})
+    ic(sweep.plan)
+    ic(sweep.result())
+    ic(sweep.reuse)
@@ -5,23 +5,272 @@
 # @Last Modified time: 2023-10-12 17:53:36
 """
 cp() \n
-@Cache(file_path="test.csv", test=False)
+@Cache(file_path="test.parquet", test=False)
 """
 
+import atexit
+import hashlib
+import inspect
+import json
+import os
+import shutil
 import sys
+import uuid
+from collections import OrderedDict
 from pathlib import Path
-from typing import Callable
+from time import perf_counter
+from typing import Any, Callable
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from icecream import ic
 
 
 ic.configureOutput(prefix="")
 
 sys.path.append(str(Path.cwd()))
-from source.modules.setting import Setting
+from source.modules.dtypes import compact, memory_usage
+from source.modules.lineage import Lineage
+from source.modules.setting import OPERATIONAL_FIELDS, Setting
 from source.modules.tools import cp
 
+try:
+    import fcntl
+except ImportError:  # Windows
+    import msvcrt
+
+
+class FileLock(object):
+    """
+    Inter-process lock on a lock file.
+    --------
+    The lock files of all artifacts are kept in one directory, "<data_path>/.locks" \n
+    (see `of`), named after the artifact, e.g. "cache__lead_lag__3f2a9c0d1b7e4a65.lock". \n
+    A lock file is never deleted while in use: removing it could let two processes \n
+    lock two different files for one artifact. `clear` removes the directory, \n
+    e.g. for housekeeping when no other process is running.
+
+    Usages:
+    --------
+        >>> with FileLock.of(Path("data/cache/lead_lag/3f2a9c0d1b7e4a65.parquet")):
+        >>>     ...
+        >>> FileLock.clear()
+    """
+
+    directory: str = ".locks"
+
+    def __init__(self, lock_path: Path) -> None:
+        self.lock_path: Path = lock_path
+        self.fd: int | None = None
+
+    @classmethod
+    def lock_directory(cls) -> Path:
+        return Path(Setting.data_path).resolve() / cls.directory
+
+    @classmethod
+    def of(cls, path: Path) -> "FileLock":
+        """Lock of an artifact (an absolute path under `Setting.data_path`)"""
+        data_path: Path = Path(Setting.data_path).resolve()
+        try:
+            name: str = "__".join(path.with_suffix("").relative_to(data_path).parts)
+        except ValueError:  # Outside the data directory
+            name = hashlib.sha256(str(path).encode()).hexdigest()[:16]
+        return cls(cls.lock_directory() / f"{name}.lock")
+
+    @classmethod
+    def clear(cls) -> None:
+        """Remove the lock directory (only while no other process uses the cache)"""
+        shutil.rmtree(cls.lock_directory(), ignore_errors=True)
+
+    def __enter__(self) -> "FileLock":
+        self.lock_path.parent.mkdir(parents=True, exist_ok=True)
+        self.fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT)
+        if "fcntl" in globals():
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+        else:
+            while True:
+                try:
+                    msvcrt.locking(self.fd, msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:  # LK_LOCK gives up after 10 seconds
+                    continue
+        return self
+
+    def __exit__(self, *args) -> None:
+        if "fcntl" in globals():
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        else:
+            msvcrt.locking(self.fd, msvcrt.LK_UNLCK, 1)
+        os.close(self.fd)
+        self.fd = None
+
+
+class CacheStats(object):
+    """
+    Telemetry of cached artifacts.
+    --------
+    Per artifact ("<file stem>/<fingerprint><suffix>"):
+    - memory_hits, disk_hits, misses: Number of calls served by each tier.
+    - puts: Number of writes of data computed outside the cache (see `Cache.put`).
+    - compute_seconds: Time spent in the wrapped function (upstream stages included).
+    - deserialize_seconds: Time spent reading the file.
+    - disk_bytes, memory_bytes: Size of the file and of the data in memory.
+    - saved_bytes: Memory saved by the compact dtype policy (see `compact`).
+
+    The stats are dumped as JSON at exit if `Setting.cache_stats_path` is set. \n
+    Worker processes send theirs back with the results (`drain`, then `merge`).
+
+    Usages:
+    --------
+        >>> CacheStats.to_frame()
+        >>> CacheStats.dump("cache_stats.json")
+        >>> CacheStats.merge(CacheStats.drain())
+    """
+
+    counters: dict[str, dict[str, Any]] = {}
+    # Sizes are overwritten, the other counters are accumulated.
+    size_fields: list[str] = ["disk_bytes", "memory_bytes", "saved_bytes"]
+
+    @classmethod
+    def record(cls, artifact: str, function: str, **values: float) -> None:
+        counter: dict[str, Any] = cls.counters.setdefault(
+            artifact,
+            {
+                "function": function,
+                "memory_hits": 0,
+                "disk_hits": 0,
+                "misses": 0,
+                "puts": 0,
+                "compute_seconds": 0.0,
+                "deserialize_seconds": 0.0,
+                "disk_bytes": 0,
+                "memory_bytes": 0,
+                "saved_bytes": 0,
+            },
+        )
+        for field, value in values.items():
+            if field in cls.size_fields:
+                counter[field] = value
+            else:
+                counter[field] += value
+
+    @classmethod
+    def drain(cls) -> dict[str, dict[str, Any]]:
+        """Take the stats recorded so far and reset them, e.g. in a worker process"""
+        counters: dict[str, dict[str, Any]] = cls.counters
+        cls.counters = {}
+        return counters
+
+    @classmethod
+    def merge(cls, counters: dict[str, dict[str, Any]]) -> None:
+        """Add the stats drained from another process"""
+        for artifact, counter in counters.items():
+            values: dict[str, Any] = dict(counter)
+            cls.record(artifact, values.pop("function"), **values)
+
+    @classmethod
+    def to_frame(cls) -> pd.DataFrame:
+        return pd.DataFrame.from_dict(cls.counters, orient="index").rename_axis(
+            "artifact"
+        )
+
+    @classmethod
+    def dump(cls, path: str | Path) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(json.dumps(cls.counters, indent=4))
+
+    @classmethod
+    def dump_at_exit(cls) -> None:
+        if Setting.cache_stats_path is not None and cls.counters:
+            cls.dump(Setting.cache_stats_path)
+
+
+atexit.register(CacheStats.dump_at_exit)
+
+
+class MemoryTier(object):
+    """
+    In-memory tier of `Cache` with LRU eviction.
+    --------
+    Entries are measured by `DataFrame.memory_usage(deep=True)`. When the total exceeds \n
+    `Setting.cache_memory_budget`, the least recently used unpinned entries are evicted \n
+    and will be read from the on-disk tier again on next use. The entry being added \n
+    is never evicted, even if it exceeds the budget alone, since it is returned. \n
+    Each entry keeps the lineage token of its artifact, so hits are recorded into \n
+    the lineage without reading the manifest again. \n
+    The budget counts the references held by the tier only: an evicted DataFrame \n
+    stays in memory while something else refers to it. Large data is therefore read \n
+    through the tier on every use (e.g. `OriginalSample().df_cash`, `Factor().df_ll`), \n
+    while singletons and `lazy_attribute`s keep small origin data only (e.g. `GDP`).
+
+    Usages:
+    --------
+        >>> Cache.path_dict.add(path, df, token)
+        >>> Cache.path_dict.pin(path)
+        >>> Cache.path_dict.nbytes
+    """
+
+    def __init__(self) -> None:
+        self.data: OrderedDict[Path, pd.DataFrame] = OrderedDict()
+        self.sizes: dict[Path, int] = {}
+        # Lineage token of the artifact of each entry (see `Cache.record_lineage`)
+        self.tokens: dict[Path, str | None] = {}
+        self.pinned: set[Path] = set()
+
+    def __contains__(self, path: Path) -> bool:
+        return path in self.data
+
+    def __getitem__(self, path: Path) -> pd.DataFrame:
+        # Mark as most recently used.
+        self.data.move_to_end(path)
+        return self.data[path]
+
+    def add(self, path: Path, df: pd.DataFrame, token: str | None = None) -> None:
+        self.data[path] = df
+        self.data.move_to_end(path)
+        self.sizes[path] = int(df.memory_usage(deep=True).sum())
+        self.tokens[path] = token
+        self.evict(keep=path)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held in memory"""
+        return sum(self.sizes.values())
+
+    def pin(self, path: Path) -> None:
+        """Never evict `path`"""
+        self.pinned.add(path)
+
+    def unpin(self, path: Path) -> None:
+        self.pinned.discard(path)
+
+    def pop(self, path: Path) -> pd.DataFrame | None:
+        self.sizes.pop(path, None)
+        self.tokens.pop(path, None)
+        return self.data.pop(path, None)
+
+    def clear(self) -> None:
+        self.data.clear()
+        self.sizes.clear()
+        self.tokens.clear()
+        self.pinned.clear()
+
+    def evict(self, keep: Path | None = None) -> None:
+        """Evict least recently used unpinned entries (but `keep`) until within the budget."""
+        if Setting.cache_memory_budget is None:
+            return
+        for path in list(self.data):
+            if self.nbytes <= Setting.cache_memory_budget:
+                break
+            if path not in self.pinned and path != keep:
+                cp(f"Evict {path.parent.name}/{path.name} from memory...", color="grey")
+                self.pop(path)
+
 
 class Cache(object):
     """
@@ -30,35 +279,103 @@ class Cache(object):
 
     Args:
     --------
-        file_path (str): The relative path of the csv/excel file.
+        file_path (str): The relative path of the cache file. \n
+        Supported suffixes: ".parquet", ".feather" (binary, dtype-preserving), ".csv", ".xlsx".
         test (bool, optional): If True, do not read or cache data. Defaults to True.
+        pin (bool, optional): If True, keep the data in memory regardless of \n
+        `Setting.cache_memory_budget`. Defaults to False.
+        settings (list[str] | None, optional): `Setting` fields the data depends on. \n
+        None → every `Setting` field but the operational ones (`OPERATIONAL_FIELDS`, \n
+        e.g. `n_jobs`). Defaults to None.
         func (Callable[..., pd.DataFrame]): The function/method to be executed.
 
+    Fingerprint:
+    -------
+        Every artifact is stored as "<file stem>/<fingerprint><suffix>", e.g. \n
+        "cache/lead_lag/3f2a9c0d1b7e4a65.parquet". The fingerprint hashes the bound \n
+        arguments (configuration attributes of `self` included), the values of \n
+        `settings` and the source code of `func`, so different configurations are \n
+        cached side by side. A "<fingerprint>.json" manifest records these inputs \n
+        and the lineage of the artifact (see `Lineage`): a stale artifact, whose origin \n
+        files or upstream artifacts changed, is recomputed.
+
+    Projection and filters:
+    -------
+        The wrapped function accepts two extra keyword arguments, which are pushed \n
+        down into the file reader when the data is not in memory:
+        - columns (list[str]): Columns to read.
+        - filters (dict): {column: (low, high)} for an inclusive range (None → open end), \n
+        or {column: [value, ...]} for membership.
+
+    Incremental updates:
+    -------
+        `func.cache` is the `Cache` of a wrapped function: `path` locates the artifact \n
+        of some arguments, `peek` reads it even if it is stale, and `put` stores an \n
+        updated one. A `Cache` is shared by all calls of its function, so the state \n
+        of a call (path, fingerprint) is never kept on it.
+
     Usages:
     -------
         >>> from pandas import DataFrame
-        >>> @Cache(file_path="test/test.csv", test=False)
+        >>> @Cache(file_path="test/test.parquet", test=False)
         >>> def func(*args, **kwargs) -> DataFrame:
         >>>     ...
         >>>     return df
         >>> df: DataFrame = func(*args, **kwargs)
+        >>> df: DataFrame = func(
+        >>>     *args,
+        >>>     columns=["period", "industry_code", "LL_max(EBITDA)"],
+        >>>     filters={"period": ("2010Q1", "2015Q4"), "industry_code": [1, 2]},
+        >>>     **kwargs,
+        >>> )
     """
 
     # Prevent repeat cache reads.
-    path_dict: dict[Path, pd.DataFrame] = {}
+    path_dict: MemoryTier = MemoryTier()
+    # Columnar binary formats, which keep int/float/category/Period dtypes.
+    binary_types: list[str] = ["parquet", "feather"]
+    # Text formats that a binary cache can be migrated from.
+    legacy_types: list[str] = ["csv", "xlsx"]
+    # Columns holding quarterly periods, restored when reading text formats.
+    period_columns: list[str] = ["period"]
+    # Settings of the dtype policy, which every artifact depends on.
+    dtype_settings: list[str] = ["compact_dtypes", "float32_measures"]
 
-    def __init__(self, file_path: str, test: bool = True) -> None:
+    def __init__(
+        self,
+        file_path: str,
+        test: bool = True,
+        pin: bool = False,
+        settings: list[str] | None = None,
+    ) -> None:
         self.file_path: str = file_path  # User's path
-        self.cache_path: Path = Path(
+        self.base_path: Path = Path(
             f"{Setting.data_path}/{file_path}"
-        ).resolve()  # Absolute path
+        ).resolve()  # Absolute path without fingerprint
         self.test: bool = test
-        self.file_type: str | None = None
+        self.pin: bool = pin
+        self.settings: list[str] | None = settings
 
     def __call__(
         self, func: Callable[..., pd.DataFrame]
     ) -> Callable[..., pd.DataFrame | None]:
+        self.func: Callable[..., pd.DataFrame] = func
+        parameters = inspect.signature(func).parameters
+
         def wrapper(*args, **kwargs) -> pd.DataFrame | None:
+            # Pop projection and filters unless the function takes them itself.
+            columns: list[str] | None = (
+                None if "columns" in parameters else kwargs.pop("columns", None)
+            )
+            filters: dict[str, Any] | None = (
+                None if "filters" in parameters else kwargs.pop("filters", None)
+            )
+            # Locate the artifact of this configuration.
+            # Everything of the call is local: the `Cache` is shared by all calls.
+            cache_path, fingerprint = self.locate(func, args, kwargs)
+            if self.pin:
+                self.path_dict.pin(cache_path)
+            artifact: str = self.artifact(cache_path)
             # If argument "test" is True,
             # execute the given function/method without reading or saving data.
             if self.test:
@@ -66,58 +383,495 @@ class Cache(object):
                     f'Testing "{func.__name__}"...',
                     color="yellow",
                 )
-                self.path_dict[self.cache_path] = func(*args, **kwargs)
-                return self.path_dict[self.cache_path]
+                start: float = perf_counter()
+                df: pd.DataFrame = self.compact(
+                    func(*args, **kwargs), artifact, func.__qualname__
+                )
+                self.path_dict.add(cache_path, df)
+                CacheStats.record(
+                    artifact,
+                    func.__qualname__,
+                    misses=1,
+                    compute_seconds=perf_counter() - start,
+                    memory_bytes=self.path_dict.sizes.get(cache_path, 0),
+                )
+                return self.select(df, columns, filters)
             # Prevent duplicate cache reads.
-            if self.cache_path in self.path_dict:
-                return self.path_dict[self.cache_path]
-            # Determine the file type.
-            self.file_type = self.cache_path.suffix[1:]
-            # Check file existence.
-            if self.cache_path.exists():
+            if cache_path in self.path_dict:
+                self.record_lineage(cache_path, self.path_dict.tokens[cache_path])
+                CacheStats.record(artifact, func.__qualname__, memory_hits=1)
+                return self.select(self.path_dict[cache_path], columns, filters)
+            df: pd.DataFrame | None = None
+            token: str | None = None
+            # Check file existence and freshness.
+            if not self.is_fresh(cache_path):
+                # Only one process computes a missing artifact,
+                # the others wait for the lock and read its result.
+                with FileLock.of(cache_path):
+                    stale_reason: str | None = self.stale_reason(cache_path)
+                    if stale_reason is not None and not self.migrate_file(
+                        cache_path, fingerprint
+                    ):
+                        # The cache does not exist or is stale,
+                        # call the function/method and save return data to the file.
+                        if cache_path.exists():
+                            cp(
+                                f"{self.file_path} is stale ({stale_reason})!",
+                                color="red",
+                            )
+                        else:
+                            cp(f"{self.file_path} not found!", color="red")
+                        cp(f"Save to {self.file_path}...", color="blue")
+                        start: float = perf_counter()
+                        with Lineage.track() as lineage:
+                            df = self.compact(
+                                func(*args, **kwargs), artifact, func.__qualname__
+                            )
+                        CacheStats.record(
+                            artifact,
+                            func.__qualname__,
+                            misses=1,
+                            compute_seconds=perf_counter() - start,
+                        )
+                        self.save_file(cache_path, df)
+                        token = self.save_manifest(cache_path, fingerprint, lineage)
+            token = self.record_lineage(cache_path, token)
+            if df is None:
                 # The cache exists, load data from the file.
                 cp(f"{self.file_path} found!", color="yellow")
                 cp(f"Read data from {self.file_path}...", color="blue")
-                df: pd.DataFrame = self.read_file()
+                start: float = perf_counter()
+                partial: bool = columns is not None or bool(filters)
+                # Partial data is not recorded.
+                df = (
+                    self.read_file(cache_path, columns, filters)
+                    if partial
+                    else self.read_file(cache_path)
+                )
+                CacheStats.record(
+                    artifact,
+                    func.__qualname__,
+                    disk_hits=1,
+                    deserialize_seconds=perf_counter() - start,
+                    disk_bytes=cache_path.stat().st_size,
+                )
+                if partial:
+                    return df
             else:
-                # The cache does not exist,
-                # call the function/method and save return data to the file.
-                cp(f"{self.file_path} not found!", color="red")
-                cp(f"Save to {self.file_path}...", color="blue")
-                df: pd.DataFrame = self.save_file(func(*args, **kwargs))
+                CacheStats.record(
+                    artifact,
+                    func.__qualname__,
+                    disk_bytes=cache_path.stat().st_size,
+                )
             # Record data that has been read.
-            self.path_dict[self.cache_path] = df
-            return df
+            self.path_dict.add(cache_path, df, token)
+            CacheStats.record(
+                artifact,
+                func.__qualname__,
+                memory_bytes=self.path_dict.sizes.get(cache_path, 0),
+            )
+            return self.select(df, columns, filters)
 
+        # The cache of the function, e.g. for the location of its artifact
+        wrapper.cache = self  # type: ignore
         return wrapper
 
-    def read_file(self) -> pd.DataFrame:
-        """Read data from a csv or excel file."""
-        if self.file_type == "csv":
-            return pd.read_csv(self.cache_path)
-        elif self.file_type == "xlsx":
-            return pd.read_excel(self.cache_path)
+    def path(self, *args, **kwargs) -> Path:
+        """Absolute path of the artifact of the arguments"""
+        return self.locate(self.func, args, kwargs)[0]
+
+    def peek(self, *args, **kwargs) -> pd.DataFrame | None:
+        """
+        The stored artifact of the arguments, fresh or stale, without computing it.
+        --------
+        None if it does not exist. `is_fresh(path)` tells whether it is stale, \n
+        e.g. for an incremental update (see `put`).
+        """
+        cache_path: Path = self.path(*args, **kwargs)
+        if not cache_path.exists():
+            return None
+        return self.read_file(cache_path)
+
+    def put(
+        self,
+        df: pd.DataFrame,
+        lineage: dict[str, dict[str, Any]],
+        *args,
+        sidecar: Callable[[str], None] | None = None,
+        **kwargs,
+    ) -> pd.DataFrame:
+        """
+        Store data as the artifact of the arguments, e.g. after an incremental update.
+        --------
+        `lineage` is the lineage frame of the computation (see `Lineage.track`), \n
+        so the artifact is fresh until its inputs change again. `sidecar` is called \n
+        with the token of the new manifest under the lock of the artifact, e.g. to \n
+        write a file that belongs to this version of the artifact.
+        """
+        cache_path, fingerprint = self.locate(self.func, args, kwargs)
+        artifact: str = self.artifact(cache_path)
+        df = self.compact(df, artifact, self.func.__qualname__)
+        with FileLock.of(cache_path):
+            cp(f"Save to {self.file_path}...", color="blue")
+            self.save_file(cache_path, df)
+            token: str = self.save_manifest(cache_path, fingerprint, lineage)
+            if sidecar is not None:
+                sidecar(token)
+        self.path_dict.add(cache_path, df, token)
+        CacheStats.record(
+            artifact,
+            self.func.__qualname__,
+            puts=1,
+            disk_bytes=cache_path.stat().st_size,
+            memory_bytes=self.path_dict.sizes.get(cache_path, 0),
+        )
+        return df
+
+    def locate(
+        self, func: Callable[..., pd.DataFrame], args: tuple, kwargs: dict
+    ) -> tuple[Path, dict[str, Any]]:
+        """
+        Absolute path of the artifact: "<file stem>/<fingerprint><suffix>".
+        --------
+        Returns the path and the inputs of the fingerprint (for the manifest).
+        """
+        # Bind arguments, so that f(1) and f(x=1) share the same fingerprint.
+        bound = inspect.signature(func).bind(*args, **kwargs)
+        bound.apply_defaults()
+        # Read the settings that the data depends on.
+        settings: list[str] = (
+            self.settings
+            if self.settings is not None
+            else [
+                field
+                for field in self.setting_fields()
+                if field not in OPERATIONAL_FIELDS
+            ]
+        )
+        settings = settings + [f for f in self.dtype_settings if f not in settings]
+        try:
+            source: str = inspect.getsource(func)
+        except (OSError, TypeError):
+            source = func.__code__.co_code.hex()
+        fingerprint_dict: dict[str, Any] = {
+            "function": func.__qualname__,
+            "arguments": {
+                name: self.tokenize(value, is_argument=True)
+                for name, value in bound.arguments.items()
+            },
+            "settings": {
+                field: self.tokenize(getattr(Setting, field)) for field in settings
+            },
+            "source": hashlib.sha256(source.encode()).hexdigest(),
+        }
+        fingerprint: str = hashlib.sha256(
+            json.dumps(fingerprint_dict, sort_keys=True).encode()
+        ).hexdigest()[:16]
+        return (
+            self.base_path.with_suffix("") / f"{fingerprint}{self.base_path.suffix}",
+            fingerprint_dict,
+        )
+
+    @staticmethod
+    def artifact(cache_path: Path) -> str:
+        """Name of an artifact in the stats, e.g. "lead_lag/3f2a9c0d1b7e4a65.parquet"."""
+        return f"{cache_path.parent.name}/{cache_path.name}"
+
+    @staticmethod
+    def compact(df: pd.DataFrame, artifact: str, function: str) -> pd.DataFrame:
+        """Apply the compact dtype policy and report the memory saved."""
+        if not isinstance(df, pd.DataFrame):
+            return df
+        nbytes: int = memory_usage(df)
+        df = compact(df)
+        saved: int = nbytes - memory_usage(df)
+        CacheStats.record(artifact, function, saved_bytes=saved)
+        if saved > 0:
+            cp(
+                f"Compact dtypes of {artifact}: {nbytes / 2**20:.2f} MiB → "
+                f"{(nbytes - saved) / 2**20:.2f} MiB",
+                color="grey",
+            )
+        return df
+
+    @staticmethod
+    def setting_fields() -> list[str]:
+        """All public `Setting` fields"""
+        return [
+            field
+            for field, value in vars(Setting).items()
+            if not field.startswith("_") and not callable(value)
+        ]
+
+    @classmethod
+    def setting_snapshot(cls) -> dict[str, Any]:
+        """Values of all public `Setting` fields, e.g. for worker processes"""
+        return {field: getattr(Setting, field) for field in cls.setting_fields()}
+
+    @classmethod
+    def tokenize(cls, value: Any, is_argument: bool = False) -> Any:
+        """
+        JSON-serializable token of a value.
+        --------
+        DataFrames/Series passed as arguments are hashed by content (see `hash_data`). \n
+        For other objects (e.g. `self`), only attributes holding configuration are used, \n
+        while attributes holding data are skipped.
+        """
+        if isinstance(value, (str, int, float, bool)) or value is None:
+            return value
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            return cls.hash_data(value) if is_argument else None
+        if isinstance(value, dict):
+            return {str(key): cls.tokenize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return [cls.tokenize(item) for item in value]
+        if isinstance(value, (set, frozenset)):
+            return sorted(map(str, value))
+        if hasattr(value, "__dict__") and is_argument:
+            return {
+                "class": type(value).__qualname__,
+                "attributes": {
+                    key: cls.tokenize(item)
+                    for key, item in vars(value).items()
+                    if not isinstance(item, (pd.DataFrame, pd.Series))
+                },
+            }
+        return repr(value)
+
+    @staticmethod
+    def hash_data(data: pd.DataFrame | pd.Series) -> str:
+        """
+        Content hash of a DataFrame/Series
+        ------
+        Column names, dtypes and the hashes of the rows in order, so reordered \n
+        rows, renamed columns or changed dtypes give another hash.
+        """
+        df: pd.DataFrame = data.to_frame() if isinstance(data, pd.Series) else data
+        digest = hashlib.sha256(
+            json.dumps([list(map(str, df.columns)), list(map(str, df.dtypes))]).encode()
+        )
+        digest.update(pd.util.hash_pandas_object(df).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def save_manifest(
+        self,
+        cache_path: Path,
+        fingerprint: dict[str, Any],
+        lineage: dict[str, dict[str, Any]] | None = None,
+    ) -> str:
+        """Record the fingerprint inputs and the lineage beside the artifact (→ token)."""
+        manifest: dict[str, Any] = {
+            **fingerprint,
+            "token": uuid.uuid4().hex,
+            **(lineage or {"upstream": {}, "origins": {}}),
+        }
+        json_path: Path = cache_path.with_suffix(".json")
+        temp_path: Path = json_path.with_name(f".{os.getpid()}.tmp.{json_path.name}")
+        temp_path.write_text(json.dumps(manifest, indent=4, sort_keys=True))
+        os.replace(temp_path, json_path)
+        return manifest["token"]
+
+    @staticmethod
+    def stale_reason(cache_path: Path) -> str | None:
+        """Why the artifact has to be computed again, None if it is fresh."""
+        if not cache_path.exists():
+            return "not found"
+        return Lineage.stale_reason(cache_path.with_suffix(".json"))
+
+    def is_fresh(self, cache_path: Path) -> bool:
+        """The artifact exists and none of its origins/upstream artifacts changed."""
+        return self.stale_reason(cache_path) is None
+
+    @staticmethod
+    def record_lineage(cache_path: Path, token: str | None = None) -> str | None:
+        """
+        Record this artifact as an upstream of the computation in progress.
+        --------
+        The token is read from the manifest unless it is known (→ token).
+        """
+        if token is None:
+            token = Lineage.load_manifest(cache_path.with_suffix(".json")).get("token")
+        if Lineage.stack:
+            Lineage.record_artifact(
+                str(cache_path.relative_to(Path(Setting.data_path).resolve())), token
+            )
+        return token
+
+    def read_file(
+        self,
+        cache_path: Path,
+        columns: list[str] | None = None,
+        filters: dict[str, Any] | None = None,
+    ) -> pd.DataFrame:
+        """
+        Read data from a parquet, feather, csv or excel file.
+        --------
+        Parquet files get `columns` and `filters` pushed down into the reader, \n
+        other formats only read `columns`. The remaining filters are applied after reading.
+        """
+        filters = filters or {}
+        # Filter columns have to be read, and are dropped afterwards.
+        read_columns: list[str] | None = (
+            None
+            if columns is None
+            else columns + [column for column in filters if column not in columns]
+        )
+        file_type: str = cache_path.suffix[1:]
+        if file_type == "parquet":
+            pushdown, filters = self.split_filters(cache_path, filters)
+            df: pd.DataFrame = pd.read_parquet(
+                cache_path, columns=read_columns, filters=pushdown or None
+            )
+        elif file_type == "feather":
+            df: pd.DataFrame = pd.read_feather(cache_path, columns=read_columns)
+        elif file_type == "csv":
+            df: pd.DataFrame = self.restore_period(
+                pd.read_csv(cache_path, usecols=read_columns)
+            )
+        elif file_type == "xlsx":
+            df: pd.DataFrame = self.restore_period(
+                pd.read_excel(cache_path, usecols=read_columns)
+            )
         else:
             raise ValueError("File type not supported!")
+        return self.select(df, columns, filters)
+
+    @staticmethod
+    def split_filters(
+        cache_path: Path, filters: dict[str, Any]
+    ) -> tuple[list[tuple[str, str, Any]], dict[str, Any]]:
+        """
+        Split filters into pyarrow predicates and filters applied after reading.
+        --------
+        Extension columns (e.g. `pd.Period`) cannot be compared by pyarrow. They are \n
+        read as `pa.ExtensionType` if pandas has registered the type, or else as their \n
+        storage type with the extension name in the field metadata.
+        """
+        schema: pa.Schema = pq.read_schema(cache_path)
+        pushdown: list[tuple[str, str, Any]] = []
+        remain: dict[str, Any] = {}
+        for column, condition in filters.items():
+            field: pa.Field = schema.field(column)
+            if isinstance(field.type, pa.ExtensionType) or (
+                b"ARROW:extension:name" in (field.metadata or {})
+            ):
+                remain[column] = condition
+            elif isinstance(condition, tuple):
+                low, high = condition
+                if low is not None:
+                    pushdown.append((column, ">=", low))
+                if high is not None:
+                    pushdown.append((column, "<=", high))
+            else:
+                pushdown.append((column, "in", list(condition)))
+        return pushdown, remain
 
-    def save_file(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Save data into a csv or excel file."""
+    @staticmethod
+    def select(
+        df: pd.DataFrame,
+        columns: list[str] | None = None,
+        filters: dict[str, Any] | None = None,
+    ) -> pd.DataFrame:
+        """Apply `columns` and `filters` to data in memory."""
+        if filters:
+            mask: np.ndarray = np.ones(len(df), dtype=bool)
+            for column, condition in filters.items():
+                series: pd.Series = df[column]
+                if isinstance(condition, tuple):
+                    low, high = condition
+                    if isinstance(series.dtype, pd.PeriodDtype):
+                        freq = series.dt.freq
+                        low = None if low is None else pd.Period(low, freq=freq)
+                        high = None if high is None else pd.Period(high, freq=freq)
+                    if low is not None:
+                        mask &= (series >= low).to_numpy()
+                    if high is not None:
+                        mask &= (series <= high).to_numpy()
+                else:
+                    mask &= series.isin(list(condition)).to_numpy()
+            df = df[mask]
+        if columns is not None:
+            df = df[columns]
+        return df
+
+    @staticmethod
+    def save_file(cache_path: Path, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Save data into a parquet, feather, csv or excel file.
+        --------
+        Data is written to a temporary file first and then renamed atomically, \n
+        so a killed run never leaves a truncated cache behind.
+        """
         # Directory generator.
-        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
-        # Read cache file.
-        if self.file_type == "csv":
-            df.to_csv(self.cache_path, index=False)
-        elif self.file_type == "xlsx":
-            df.to_excel(self.cache_path, index=False)
-        else:
-            raise ValueError("File type not supported!")
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        # Temporary file in the same directory, keeping the suffix for the writer.
+        temp_path: Path = cache_path.with_name(f".{os.getpid()}.tmp.{cache_path.name}")
+        file_type: str = cache_path.suffix[1:]
+        try:
+            if file_type == "parquet":
+                df.to_parquet(temp_path, index=False)
+            elif file_type == "feather":
+                df.reset_index(drop=True).to_feather(temp_path)
+            elif file_type == "csv":
+                df.to_csv(temp_path, index=False)
+            elif file_type == "xlsx":
+                df.to_excel(temp_path, index=False)
+            else:
+                raise ValueError("File type not supported!")
+            os.replace(temp_path, cache_path)
+            # Lock file of earlier versions, which was kept beside the artifact
+            cache_path.with_suffix(".lock").unlink(missing_ok=True)
+        finally:
+            temp_path.unlink(missing_ok=True)
+        return df
+
+    def restore_period(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Convert period strings (e.g. "2010Q1") of a text cache back to `pd.Period`"""
+        for column in self.period_columns:
+            if column in df.columns and df[column].dtype == object:
+                df[column] = pd.PeriodIndex(df[column], freq="Q")
         return df
 
+    def migrate_file(self, cache_path: Path, fingerprint: dict[str, Any]) -> bool:
+        """
+        Migrate a legacy cache to the fingerprinted binary artifact.
+        --------
+        The legacy file is the un-fingerprinted `file_path`, possibly with a text \n
+        suffix, e.g. "cache/lead_lag.parquet" or "cache/lead_lag.csv" for \n
+        "cache/lead_lag.parquet". It is adopted by the first configuration asking for it, \n
+        converted once and then removed.
+
+        Returns:
+        --------
+            bool: True if a legacy cache has been migrated.
+        """
+        file_type: str = cache_path.suffix[1:]
+        if file_type not in self.binary_types or cache_path.exists():
+            return False
+        for legacy_type in [file_type] + self.legacy_types:
+            legacy_path: Path = self.base_path.with_suffix(f".{legacy_type}")
+            if not legacy_path.exists():
+                continue
+            cp(f"Migrate {legacy_path.name} to {cache_path.name}...", color="blue")
+            if legacy_type == "csv":
+                df: pd.DataFrame = pd.read_csv(legacy_path)
+            elif legacy_type == "xlsx":
+                df: pd.DataFrame = pd.read_excel(legacy_path)
+            elif legacy_type == "parquet":
+                df: pd.DataFrame = pd.read_parquet(legacy_path)
+            else:
+                df: pd.DataFrame = pd.read_feather(legacy_path)
+            self.save_file(cache_path, self.restore_period(df))
+            self.save_manifest(cache_path, fingerprint)
+            legacy_path.unlink()
+            return True
+        return False
+
 
 class TestCacheData:
     """Test DataFrame"""
 
-    @Cache(file_path="cache/test1.csv", test=False)
+    @Cache(file_path="cache/test1.parquet", test=False)
     def test_df1(self) -> pd.DataFrame:
         return pd.DataFrame(
             [
@@ -139,8 +893,25 @@ class TestCacheData:
             columns=["D", "E", "F"],
         )
 
+    @Cache(file_path="cache/test_period.parquet", test=False)
+    def test_df3(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                "period": pd.period_range("2009Q1", "2016Q4", freq="Q"),
+                "A": range(32),
+            }
+        )
+
 
 if __name__ == "__main__":
     test = TestCacheData()
     ic(test.test_df1())
     ic(test.test_df2())
+    # A Period range filter on the artifact read back from disk
+    test.test_df3()
+    Cache.path_dict.clear()
+    df_period: pd.DataFrame = test.test_df3(filters={"period": ("2010Q1", "2015Q4")})
+    assert df_period["period"].min() == pd.Period("2010Q1", freq="Q")
+    assert df_period["period"].max() == pd.Period("2015Q4", freq="Q")
+    assert len(df_period) == 24
+    ic(df_period)
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+# @Author: 昵称有六个字
+# @Date:   2023-10-20 09:41:26
+# @Last Modified by:   昵称有六个字
+# @Last Modified time: 2023-10-20 11:15:03
+"""
+df = compact(df) \n
+memory_usage(df)
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from icecream import ic
+
+ic.configureOutput(prefix="")
+sys.path.append(str(Path.cwd()))
+from source.modules.setting import Setting
+
+# Compact dtypes of the panel keys (nullable "Int..." if a column holds NaN)
+KEY_DTYPES: dict[str, str] = {
+    "stock": "int32",
+    "year": "int16",
+    "quarter": "int8",
+    "month": "int8",
+    "industry_code": "int16",
+}
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    """Bytes of a DataFrame in memory"""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def key_dtype(series: pd.Series, dtype: str) -> str | None:
+    """The compact dtype of a key column, None if its values do not fit"""
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        return None
+    values: pd.Series = series.dropna()
+    if len(values) and not (values == values.round()).all():
+        return None
+    info = np.iinfo(dtype)
+    if len(values) and (values.min() < info.min or values.max() > info.max):
+        return None
+    return dtype.capitalize() if series.isna().any() else dtype
+
+
+def compact(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Apply the compact dtype policy.
+    --------
+    - Keys: int32 stock, int16 year and industry_code, int8 quarter and month.
+    - Measures: float32 if `Setting.float32_measures`.
+
+    Nothing is changed if `Setting.compact_dtypes` is False.
+    """
+    if not Setting.compact_dtypes:
+        return df
+    dtypes: dict[str, str] = {}
+    for column, dtype in KEY_DTYPES.items():
+        if column in df.columns:
+            compact_dtype: str | None = key_dtype(df[column], dtype)
+            if compact_dtype is not None and df[column].dtype != compact_dtype:
+                dtypes[column] = compact_dtype
+    if Setting.float32_measures:
+        dtypes.update(
+            {
+                column: "float32"
+                for column in df.columns
+                if column not in dtypes and df[column].dtype == "float64"
+            }
+        )
+    return df.astype(dtypes) if dtypes else df
+
+
+if __name__ == "__main__":
+    df = pd.DataFrame(
+        {
+            "stock": [1, 2],
+            "year": [2010, 2011],
+            "quarter": [1, 2],
+            "industry_code": [3.0, np.nan],
+            "EBITDA": [1.0, 2.0],
+        }
+    )
+    ic(memory_usage(df), compact(df).dtypes, memory_usage(compact(df)))
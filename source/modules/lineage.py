@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+# @Author: 昵称有六个字
+# @Date:   2023-10-19 10:02:17
+# @Last Modified by:   昵称有六个字
+# @Last Modified time: 2023-10-19 16:45:08
+"""
+df = read_origin(path) \n
+with Lineage.track() as lineage: ... \n
+Lineage.stale_reason(manifest_path)
+"""
+
+import hashlib
+import json
+import sys
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator
+
+import pandas as pd
+from icecream import ic
+
+ic.configureOutput(prefix="")
+sys.path.append(str(Path.cwd()))
+from source.modules.setting import Setting
+
+
+class Lineage(object):
+    """
+    Lineage of cached artifacts.
+    --------
+    While a cached function is computed, every cached artifact it calls (upstream) \n
+    and every origin file it reads are recorded into its lineage frame. `Cache` saves \n
+    the frame into the artifact's manifest ("<fingerprint>.json"):
+
+        {
+            "token": "<random id of this version>",
+            "upstream": {"cache/cashflow/841917601dfd2ee2.parquet": "<token>"},
+            "origins": {"data/origin/cashflow/income.csv": {"size": ..., "mtime": ...}},
+        }
+
+    An artifact is stale when an origin file changed, or when an upstream artifact \n
+    is missing, stale or has been recomputed (its token changed).
+
+    Usages:
+    --------
+        >>> with Lineage.track() as lineage:
+        >>>     df = func()
+        >>> reason: str | None = Lineage.stale_reason(manifest_path)
+    """
+
+    # Lineage frames of the computations in progress (innermost last).
+    stack: list[dict[str, dict[str, Any]]] = []
+
+    @classmethod
+    @contextmanager
+    def track(cls) -> Iterator[dict[str, dict[str, Any]]]:
+        """Open a lineage frame for a computation."""
+        frame: dict[str, dict[str, Any]] = {"upstream": {}, "origins": {}}
+        cls.stack.append(frame)
+        try:
+            yield frame
+        finally:
+            cls.stack.remove(frame)
+
+    @classmethod
+    def replay(cls, frame: dict[str, dict[str, Any]]) -> None:
+        """Record a finished frame into the current computation, e.g. for singletons."""
+        if cls.stack:
+            cls.stack[-1]["upstream"].update(frame["upstream"])
+            cls.stack[-1]["origins"].update(frame["origins"])
+
+    @classmethod
+    def record_artifact(cls, artifact: str, token: str | None) -> None:
+        """Record an upstream artifact (path relative to `Setting.data_path`)."""
+        if cls.stack and token is not None:
+            cls.stack[-1]["upstream"][artifact] = token
+
+    @classmethod
+    def record_origin(cls, path: str | Path) -> None:
+        """Record an origin file."""
+        if cls.stack:
+            cls.stack[-1]["origins"][str(Path(path))] = cls.stat(path)
+
+    @staticmethod
+    def stat(path: str | Path) -> dict[str, Any]:
+        """Size and modified time (and content hash if `Setting.cache_hash_origins`)"""
+        stat = Path(path).stat()
+        file_stat: dict[str, Any] = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+        if Setting.cache_hash_origins:
+            file_stat["sha256"] = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+        return file_stat
+
+    @staticmethod
+    def load_manifest(manifest_path: Path) -> dict[str, Any]:
+        try:
+            return json.loads(manifest_path.read_text())
+        except (OSError, ValueError):
+            return {}
+
+    @classmethod
+    def origin_changed(cls, path: str, file_stat: dict[str, Any]) -> bool:
+        if not Path(path).exists():
+            return True
+        stat = Path(path).stat()
+        if stat.st_size != file_stat["size"]:
+            return True
+        if stat.st_mtime_ns == file_stat["mtime"]:
+            return False
+        # Touched but maybe not modified.
+        return (
+            "sha256" not in file_stat
+            or hashlib.sha256(Path(path).read_bytes()).hexdigest()
+            != file_stat["sha256"]
+        )
+
+    @classmethod
+    def stale_reason(
+        cls, manifest_path: Path, checked: dict[Path, str | None] | None = None
+    ) -> str | None:
+        """
+        Why an artifact is stale.
+        --------
+
+        Args:
+        --------
+            manifest_path (Path): The manifest ("<fingerprint>.json") of the artifact.
+            checked (dict[Path, str | None] | None): Results of manifests checked already.
+
+        Returns:
+        --------
+            str | None: None if the artifact is fresh. \n
+            Artifacts without recorded lineage (e.g. migrated ones) are fresh.
+        """
+        checked = {} if checked is None else checked
+        if manifest_path in checked:
+            return checked[manifest_path]
+        manifest: dict[str, Any] = cls.load_manifest(manifest_path)
+        reason: str | None = None
+        for path, file_stat in manifest.get("origins", {}).items():
+            if cls.origin_changed(path, file_stat):
+                reason = f"{path} changed"
+                break
+        for artifact, token in manifest.get("upstream", {}).items():
+            if reason is not None:
+                break
+            upstream_path: Path = (
+                Path(f"{Setting.data_path}/{artifact}").resolve().with_suffix(".json")
+            )
+            if cls.load_manifest(upstream_path).get("token") != token:
+                reason = f"{artifact} recomputed or removed"
+            elif cls.stale_reason(upstream_path, checked) is not None:
+                reason = f"{artifact} stale"
+        checked[manifest_path] = reason
+        return reason
+
+
+def read_origin(path: str | Path, **kwargs) -> pd.DataFrame:
+    """`pd.read_csv` an origin file and record it into the current lineage."""
+    Lineage.record_origin(path)
+    return pd.read_csv(path, **kwargs)
+
+
+if __name__ == "__main__":
+    with Lineage.track() as lineage:
+        read_origin(f"{Setting.macro_path}/GDP.csv")
+    ic(lineage)
@@ -3,7 +3,13 @@
 # @Date:   2023-08-17 09:12:59
 # @Last Modified by:   昵称有六个字
 # @Last Modified time: 2023-10-18 20:54:53
+"""
+Setting.window_period \n
+with override(window_period=16, price_index="CPI"): ...
+"""
 
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
 
 from icecream import ic
 
@@ -32,10 +38,39 @@ class Setting(object):
 
     # 2.4 Trade
     trade_path: str = f"{origin_path}/trade"
-    
+
     # 2.5 Finance
     finance_path: str = f"{origin_path}/finance"
-    
+
+    # 3. Threads that parse origin files concurrently
+    origin_workers: int = 8
+
+    # 4. Rows per chunk when streaming large origin files, None → whole file
+    chunk_size: int | None = 1_000_000
+
+    # & Cache
+    # Byte budget of the in-memory cache tier (LRU), None → unbounded
+    cache_memory_budget: int | None = None
+    # Hash origin files for cache invalidation (otherwise size and modified time)
+    cache_hash_origins: bool = False
+    # JSON file that cache telemetry is dumped into at exit, None → no dump
+    cache_stats_path: str | None = None
+
+    # & Data Types
+    # Compact stock (int32), year (int16), quarter/month (int8) and industry (int16)
+    compact_dtypes: bool = True
+    # Store measures as float32 instead of float64
+    float32_measures: bool = False
+
+    # & Parallel
+    # Processes computing the windows of the lead-lag table, 1 → serial
+    n_jobs: int = 1
+
+    # & Correlation Cube
+    # Persist the absolute cross-correlations of the lead-lag table as a memory-mapped cube
+    corr_cube: bool = False
+    # Store the cube as float32 instead of float64
+    corr_cube_float32: bool = False
 
     # & Sample
     # Sample start year
@@ -84,5 +119,70 @@ class Setting(object):
     lag_group_industry_number: int = 10
 
 
+# Fields that change how data is computed, read or stored, but not the data itself
+OPERATIONAL_FIELDS: list[str] = [
+    "origin_workers",
+    "chunk_size",
+    "cache_memory_budget",
+    "cache_hash_origins",
+    "cache_stats_path",
+    "n_jobs",
+]
+
+# Fields derived from other fields (as written in `Setting`), in dependency order
+DERIVED_FIELDS: dict[str, Callable[[], Any]] = {
+    "origin_path": lambda: f"{Setting.data_path}/origin",
+    "basic_path": lambda: f"{Setting.origin_path}/basic",
+    "macro_path": lambda: f"{Setting.origin_path}/macro",
+    "cashflow_path": lambda: f"{Setting.origin_path}/cashflow",
+    "trade_path": lambda: f"{Setting.origin_path}/trade",
+    "finance_path": lambda: f"{Setting.origin_path}/finance",
+    "sample_periods": lambda: Setting.shift_period * 2 + Setting.window_period + 1,
+    "cashflow_measures": lambda: Setting.ebitda_columns
+    + Setting.income_columns
+    + Setting.cashflow_columns,
+    "shift_rank_period": lambda: Setting.delay_max_period,
+}
+
+
+@contextmanager
+def override(**fields: Any) -> Iterator[None]:
+    """
+    Override `Setting` fields temporarily.
+    --------
+    Derived fields that hold their derived value (e.g. `sample_periods`, \n
+    `basic_path`) are derived again from the new values, unless they are \n
+    overridden as well. All fields are restored on exit.
+
+    Usages:
+    --------
+        >>> with override(window_period=16, price_index="CPI"):
+        >>>     Setting.sample_periods  # 2 * 2 + 16 + 1
+    """
+    unknown: list[str] = [field for field in fields if not hasattr(Setting, field)]
+    if unknown:
+        raise AttributeError(f"Unknown Setting fields: {unknown}")
+    derived: list[str] = [
+        field
+        for field, derive in DERIVED_FIELDS.items()
+        if field not in fields and getattr(Setting, field) == derive()
+    ]
+    saved: dict[str, Any] = {
+        field: getattr(Setting, field) for field in [*fields, *derived]
+    }
+    try:
+        for field, value in fields.items():
+            setattr(Setting, field, value)
+        for field in derived:
+            setattr(Setting, field, DERIVED_FIELDS[field]())
+        yield
+    finally:
+        for field, value in saved.items():
+            setattr(Setting, field, value)
+
+
 if __name__ == "__main__":
     ic(Setting.basic_path)
+    with override(window_period=16, data_path="test"):
+        ic(Setting.sample_periods, Setting.basic_path)
+    ic(Setting.sample_periods, Setting.basic_path)
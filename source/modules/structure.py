@@ -9,6 +9,7 @@ import sys
 from pathlib import Path
 
 from icecream import ic
+import numpy as np
 import pandas as pd
 
 ic.configureOutput(prefix="")
@@ -45,16 +46,39 @@ class Window(object):
 
 
 class CashflowWindow(object):
-    """Window for a specific cashflow column"""
+    """
+    Window for specific cashflow columns
+    ------
+    The measures share the rows of the window (`df`, not copied), and `masks` \n
+    holds the rows kept for each measure. `window` builds the DataFrame of each \n
+    measure on demand.
+    """
+
+    keys: list[str] = ["stock", "year", "quarter", "industry_code"]
 
-    def __init__(self, window: Window, cashflow_columns: list[str]) -> None:
+    def __init__(
+        self,
+        window: Window,
+        cashflow_columns: list[str],
+        masks: pd.DataFrame | None = None,
+    ) -> None:
         self.cashflow_columns: list[str] = cashflow_columns
         self.period = window.period
-        self.window: dict[str, pd.DataFrame] = {}
-        for cashflow_column in self.cashflow_columns:
-            self.window[cashflow_column] = window.df[
-                ["stock", "year", "quarter", "industry_code", cashflow_column]
+        self.df: pd.DataFrame = window.df
+        self.masks: pd.DataFrame = (
+            pd.DataFrame(True, index=self.df.index, columns=cashflow_columns)
+            if masks is None
+            else masks
+        )
+
+    @property
+    def window(self) -> dict[str, pd.DataFrame]:
+        return {
+            cashflow_column: self.df.loc[
+                self.masks[cashflow_column].to_numpy(), self.keys + [cashflow_column]
             ]
+            for cashflow_column in self.cashflow_columns
+        }
 
     def __repr__(self):
         return f"Window: {self.period}\n" + str(
@@ -81,23 +105,69 @@ class LLWindow(object):
     ```
     """
 
+    keys: list[str] = ["industry_code", "year", "quarter"]
+
     def __init__(self, cashflow_window: CashflowWindow, df_gdp: pd.DataFrame):
         self.period: pd.Period = cashflow_window.period
         self.cashflow_columns = cashflow_window.cashflow_columns
-        self.df_dict: dict[str, pd.DataFrame] = {
+        self.df_dict: dict[str, pd.DataFrame] = self.merge_gdp(
+            {
+                cashflow_column: Adjust(
+                    df_adjust=df_sum, adjust_column=cashflow_column
+                ).adjust_result
+                for cashflow_column, df_sum in self.industry_sum(
+                    cashflow_window
+                ).items()
+            },
+            Adjust(df_adjust=df_gdp, adjust_column="GDP").adjust_result,
+        )
+
+    @classmethod
+    def industry_sum(cls, cashflow_window: CashflowWindow) -> dict[str, pd.DataFrame]:
+        """
+        Industry × quarter sums of each measure over its covered rows
+        ------
+        Only the rows in the mask of the measure and the needed columns are copied.
+        """
+        return {
+            cashflow_column: cashflow_window.df.loc[
+                cashflow_window.masks[cashflow_column].to_numpy(),
+                cls.keys + [cashflow_column],
+            ]
+            .groupby(cls.keys)[[cashflow_column]]
+            .sum()
+            .reset_index()
+            for cashflow_column in cashflow_window.cashflow_columns
+        }
+
+    @classmethod
+    def from_df_dict(
+        cls, period: pd.Period, df_dict: dict[str, pd.DataFrame]
+    ) -> "LLWindow":
+        """
+        Window of (adjusted) measures merged with GDP already, see `merge_gdp`
+        ------
+        E.g. shared by the points of a parameter sweep: the frames are copied, \n
+        since `LeadLag` modifies them.
+        """
+        ll_window: LLWindow = cls.__new__(cls)
+        ll_window.period = period
+        ll_window.cashflow_columns = list(df_dict)
+        ll_window.df_dict = {
+            cashflow_column: df.copy() for cashflow_column, df in df_dict.items()
+        }
+        return ll_window
+
+    @staticmethod
+    def merge_gdp(
+        df_adjust_dict: dict[str, pd.DataFrame], df_gdp_adjust: pd.DataFrame
+    ) -> dict[str, pd.DataFrame]:
+        """Pair the adjusted industry sums of each measure with adjusted GDP"""
+        return {
             cashflow_column: pd.merge(
-                Adjust(
-                    df_adjust=df_cash.drop(columns=["stock"])
-                    .groupby(["industry_code", "year", "quarter"])
-                    .sum()
-                    .reset_index(),
-                    adjust_column=cashflow_column,
-                ).adjust_result,
-                Adjust(df_adjust=df_gdp, adjust_column="GDP").adjust_result,
-                on=["year", "quarter"],
-                how="inner",
+                df_adjust, df_gdp_adjust, on=["year", "quarter"], how="inner"
             ).sort_values(by=["industry_code", "year", "quarter"])
-            for cashflow_column, df_cash in cashflow_window.window.items()
+            for cashflow_column, df_adjust in df_adjust_dict.items()
         }
 
     def __repr__(self):
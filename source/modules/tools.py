@@ -5,7 +5,10 @@
 # @Last Modified time: 2023-10-12 18:59:03
 """
 @singleton()
+@lazy_attribute
 Window(period, df)
+quarter_ordinal(year, quarter) \n
+ordinal_to_period(ordinal), period_to_ordinal(period)
 """
 
 import math
@@ -23,6 +26,7 @@ from termcolor import cprint
 
 ic.configureOutput(prefix="")
 sys.path.append(str(Path.cwd()))
+from source.modules.lineage import Lineage
 
 
 def cp(content: Any, color: Optional[str] = None) -> None:
@@ -58,6 +62,43 @@ def cp(content: Any, color: Optional[str] = None) -> None:
     )
 
 
+def quarter_ordinal(year, quarter):
+    """
+    Integer quarter ordinal: year * 4 + quarter - 1
+    ------
+    Works on scalars, arrays and Series, e.g. 2010Q1 → 8040, 2010Q2 → 8041.
+    """
+    return year * 4 + quarter - 1
+
+
+# Quarter ordinal of 1970Q1, where pandas counts quarterly periods from
+PERIOD_EPOCH: int = quarter_ordinal(1970, 1)
+
+
+def ordinal_to_period(ordinal):
+    """
+    Quarterly `pd.Period` of quarter ordinals (for display)
+    ------
+    A scalar gives a `pd.Period`, an array/Series gives a `PeriodArray`.
+    """
+    if np.ndim(ordinal) == 0:
+        return pd.Period(ordinal=int(ordinal) - PERIOD_EPOCH, freq="Q")
+    return pd.arrays.PeriodArray(
+        np.asarray(ordinal, dtype=np.int64) - PERIOD_EPOCH, dtype="period[Q-DEC]"
+    )
+
+
+def period_to_ordinal(period):
+    """
+    Quarter ordinals of quarterly periods
+    ------
+    A scalar gives an int, an array/Series of periods gives an int64 array.
+    """
+    if isinstance(period, pd.Period):
+        return period.ordinal + PERIOD_EPOCH
+    return pd.PeriodIndex(period, freq="Q").asi8 + PERIOD_EPOCH
+
+
 def singleton(cls):
     """
     A singleton pattern decorator for a class.
@@ -90,15 +131,57 @@ def singleton(cls):
     """
 
     instances = {}
+    # Origin files and cached artifacts read by the instance
+    lineages = {}
 
     def get_instance(*args, **kwargs):
         if cls not in instances:
-            instances[cls] = cls(*args, **kwargs)
+            with Lineage.track() as lineage:
+                instances[cls] = cls(*args, **kwargs)
+            lineages[cls] = lineage
+        # Every user of the instance depends on what it has read.
+        Lineage.replay(lineages[cls])
         return instances[cls]
 
     return get_instance
 
 
+class lazy_attribute(object):
+    """
+    A lazily evaluated, memoized class attribute.
+    ------
+    The decorated function is called with the class on first access (from the \n
+    class or an instance) instead of at import, and its result is memoized. \n
+    Like `singleton`, what it has read is replayed into the lineage of every user.
+
+    Usages:
+    ------
+        ```python
+        class Delete(object):
+            @lazy_attribute
+            def df_anno(cls) -> pd.DataFrame:
+                return AnnotationDate().df_anno
+
+        Delete.df_anno  # Read on first access
+        ```
+    """
+
+    def __init__(self, func) -> None:
+        self.func = func
+        self.__doc__ = func.__doc__
+        # Owner class → (value, lineage)
+        self.values: dict[type, tuple[Any, dict]] = {}
+
+    def __get__(self, instance, owner):
+        if owner not in self.values:
+            with Lineage.track() as lineage:
+                value = self.func(owner)
+            self.values[owner] = (value, lineage)
+        value, lineage = self.values[owner]
+        Lineage.replay(lineage)
+        return value
+
+
 class TTest(object):
     """
     T-Test (Applying the Newey and West (1987) adjustment)